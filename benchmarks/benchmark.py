@@ -0,0 +1,267 @@
+"""Benchmark driver latency, throughput and Modbus transactions per operation.
+
+The benchmarks run against a local simulated instrument with configurable network
+latency. Results are printed and saved as JSON so they can be compared between
+releases with the --baseline option.
+"""
+
+import argparse
+import asyncio
+import json
+import pathlib
+import platform
+import sys
+import time
+
+sys.path.insert(1, str(pathlib.Path.cwd().parent.joinpath("src")))
+import xet7019z
+from xet7019z.simulator import SimulatedXet7019z
+
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--port",
+    type=int,
+    default=5020,
+    help="Port of the simulated instrument, e.g. 5020",
+)
+parser.add_argument(
+    "--latency",
+    type=float,
+    default=0.0005,
+    help="Simulated network latency per transaction in seconds",
+)
+parser.add_argument(
+    "--jitter",
+    type=float,
+    default=0,
+    help="Maximum random jitter added to the latency in seconds",
+)
+parser.add_argument(
+    "--iterations",
+    type=int,
+    default=200,
+    help="Number of timed calls per benchmark",
+)
+parser.add_argument(
+    "--output",
+    type=str,
+    default="bench_results.json",
+    help="File to save results to",
+)
+parser.add_argument(
+    "--baseline",
+    type=str,
+    default=None,
+    help="Results file of a previous run to compare against",
+)
+args = parser.parse_args()
+
+
+def percentile(values, q):
+    """Get a percentile of a list of values.
+
+    Parameters
+    ----------
+    values : list of float
+        Sorted values.
+    q : float
+        Percentile, 0 to 100.
+
+    Returns
+    -------
+    value : float
+        Nearest-rank percentile.
+    """
+    index = min(len(values) - 1, max(0, round(q / 100 * len(values)) - 1))
+    return values[index]
+
+
+def run(name, fn, sim, iterations):
+    """Time repeated calls of a function.
+
+    Parameters
+    ----------
+    name : str
+        Benchmark name.
+    fn : callable
+        Function to benchmark, taking no arguments.
+    sim : SimulatedXet7019z
+        Simulated instrument, used to count Modbus transactions.
+    iterations : int
+        Number of timed calls.
+
+    Returns
+    -------
+    result : dict
+        Benchmark statistics.
+    """
+    # warm up, e.g. to fill caches
+    fn()
+
+    latencies = []
+    transactions = sim.transactions
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+    transactions = sim.transactions - transactions
+
+    latencies.sort()
+    result = {
+        "ops_per_sec": iterations / elapsed,
+        "p50_ms": 1e3 * percentile(latencies, 50),
+        "p99_ms": 1e3 * percentile(latencies, 99),
+        "transactions_per_op": transactions / iterations,
+    }
+
+    print(
+        f"{name:<28} {result['ops_per_sec']:>10.1f} {result['p50_ms']:>9.3f} "
+        + f"{result['p99_ms']:>9.3f} {result['transactions_per_op']:>8.2f}"
+    )
+
+    return result
+
+
+def legacy_setup(daq, channels):
+    """Set up channels one setting at a time, like the original MQTT example.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Connected instrument object.
+    channels : dict
+        AI range settings keyed by channel.
+    """
+    for channel in range(daq.ai_channels):
+        daq.enable_ai(channel, False)
+    daq.set_ai_noise_filter(50)
+    daq.enable_cjc(True)
+    for channel, ai_range in channels.items():
+        daq.set_ai_range(channel, ai_range)
+        daq.enable_ai(channel, True)
+
+
+def legacy_scan(daq):
+    """Measure all channels one at a time.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Connected instrument object.
+    """
+    return [daq.measure(channel) for channel in range(daq.ai_channels)]
+
+
+async def async_scans(sim, n_modules, iterations):
+    """Scan several connections to the simulated instrument from one event loop.
+
+    Parameters
+    ----------
+    sim : SimulatedXet7019z
+        Simulated instrument.
+    n_modules : int
+        Number of concurrent connections.
+    iterations : int
+        Number of concurrent scans of all connections.
+
+    Returns
+    -------
+    elapsed : float
+        Time taken in seconds.
+    transactions : int
+        Number of Modbus transactions served during the scans.
+    """
+    daqs = [xet7019z.AsyncXet7019z() for _ in range(n_modules)]
+    for daq in daqs:
+        await daq.connect(sim.host, sim.port, 5, reset=False)
+        await daq.refresh_ai_ranges()
+
+    transactions = sim.transactions
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await asyncio.gather(*[daq.measure_all() for daq in daqs])
+    elapsed = time.perf_counter() - start
+    transactions = sim.transactions - transactions
+
+    for daq in daqs:
+        await daq.disconnect()
+
+    return elapsed, transactions
+
+
+channels = {0: 5, 1: 5, 5: 15, 6: 8}
+setup_config = {
+    "ranges": channels,
+    "enabled": {channel: channel in channels for channel in range(10)},
+    "plf": 50,
+    "cjc": True,
+}
+
+results = {
+    "meta": {
+        "time": time.time(),
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "iterations": args.iterations,
+    },
+    "benchmarks": {},
+}
+
+print(f"Simulated latency: {1e3 * args.latency} ms, jitter: {1e3 * args.jitter} ms\n")
+print(f"{'benchmark':<28} {'ops/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'tx/op':>8}")
+
+with SimulatedXet7019z(
+    port=args.port, latency=args.latency, jitter=args.jitter
+) as sim, xet7019z.xet7019z() as daq:
+    daq.connect("localhost", args.port, 5, True)
+
+    benchmarks = {
+        "measure": lambda: daq.measure(0),
+        "measure_all": lambda: daq.measure_all(),
+        "scan_per_channel": lambda: legacy_scan(daq),
+        "get_ai_range": lambda: daq.get_ai_range(0),
+        "refresh_ai_ranges": lambda: daq.refresh_ai_ranges(),
+        "get_cjc_offset": lambda: daq.get_cjc_offset(0),
+        "get_id": lambda: daq.get_id(),
+        "get_config": lambda: daq.get_config(),
+        "apply_config_unchanged": lambda: daq.apply_config(**setup_config),
+        "setup_per_setting": lambda: legacy_setup(daq, channels),
+    }
+
+    for name, fn in benchmarks.items():
+        results["benchmarks"][name] = run(name, fn, sim, args.iterations)
+
+    # many modules polled from one event loop, simulated by several connections
+    n_modules = 10
+    iterations = max(1, args.iterations // 10)
+    elapsed, transactions = asyncio.run(async_scans(sim, n_modules, iterations))
+    name = f"async_measure_all_x{n_modules}"
+    results["benchmarks"][name] = {
+        "ops_per_sec": iterations / elapsed,
+        "transactions_per_op": transactions / iterations,
+    }
+    print(
+        f"{name:<28} {iterations / elapsed:>10.1f} {'':>9} {'':>9} "
+        + f"{transactions / iterations:>8.2f}"
+    )
+
+if args.baseline is not None:
+    with open(args.baseline, "r") as f:
+        baseline = json.load(f)
+
+with open(args.output, "w") as f:
+    json.dump(results, f, indent=2)
+print(f"\nResults saved to {args.output}")
+
+if args.baseline is not None:
+    print(f"\nChange in ops/s relative to {args.baseline}:")
+    for name, result in results["benchmarks"].items():
+        try:
+            old = baseline["benchmarks"][name]["ops_per_sec"]
+        except KeyError:
+            continue
+        change = 100 * (result["ops_per_sec"] / old - 1)
+        print(f"{name:<28} {change:>+9.1f} %")
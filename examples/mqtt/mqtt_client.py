@@ -1,222 +1,581 @@
-"""MQTT client for PET-7018Z."""
+"""MQTT client for PET-7018Z.
+
+The client runs as an asyncio service. The paho network loop runs in its own thread
+and hands incoming messages to the event loop, where they wait in a bounded request
+queue. A single device task owns the instrument connection: it handles requests one
+at a time and runs continuous mode scans between them. Outgoing messages wait in a
+bounded outbox until the publisher task hands them to paho, whose own queue is
+bounded too. When a queue is full its overflow policy decides what gets dropped, so
+latency and memory stay bounded under bursty traffic. Queue depths and drop
+counters are published periodically on `daq/stats`.
+"""
 
 import argparse
+import asyncio
 import collections
+import itertools
 import json
-import queue
 import pathlib
-import threading
 import time
 import traceback
 import uuid
 import sys
 
 import paho.mqtt.client as mqtt
-import paho.mqtt.publish as publish
 
-from mqtt_tools.queue_publisher import MQTTQueuePublisher
+from scan_codec import ScanBatcher
 
 sys.path.insert(1, str(pathlib.Path.cwd().parent.parent.joinpath("src")))
-import xet7019z.xet7019z as xet7019z
+from xet7019z import AsyncXet7019z, FixedRateScheduler
 
-parser = argparse.ArgumentParser()
-parser.add_argument(
-    "-mqtthost",
-    type=str,
-    default="127.0.0.1",
-    help="IP address or hostname for MQTT broker.",
-)
+POLICIES = ["drop_newest", "drop_oldest", "coalesce"]
 
-args = parser.parse_args()
+# coalescing key of each request topic that sets state, so only the latest pending
+# request for that state needs handling. Requests on other topics, e.g. run log
+# messages that stop continuous mode, are never coalesced.
+COALESCE_KEYS = {
+    "daq/single": "daq/single",
+    "measurement/run": "measurement/run",
+    "daq/start": "daq/run-state",
+    "daq/stop": "daq/run-state",
+}
 
-# start queue publisher
-mqttqp = MQTTQueuePublisher()
-mqttqp.connect(args.mqtthost)
-mqttqp.loop_start()
 
-# hold start/stop condition in thread-safe container
-start = collections.deque(maxlen=1)
-start.append(False)
+class BoundedQueue:
+    """Fixed capacity asyncio queue with an overflow policy.
 
-# container for config data sent over mqtt
-config = {}
+    Policies:
 
-# create queue for worker tasks
-q = queue.Queue()
+        * drop_newest : discard an item put into a full queue.
+        * drop_oldest : discard the oldest item in a full queue to make room.
+        * coalesce : replace a pending item with the same key, moving it to the back
+          of the queue, otherwise behave like drop_oldest. Items with a key of
+          `None` are never replaced.
 
-# inti the instrument object
-daq = xet7019z()
-
-
-def worker():
-    """Work on requests sent over MQTT."""
-    while True:
-        msg = q.get()
+    `put` never blocks so it can be called from callbacks on the event loop.
+    """
 
+    def __init__(self, maxsize, policy="drop_oldest"):
+        """Construct object.
+
+        Parameters
+        ----------
+        maxsize : int
+            Maximum number of items in the queue.
+        policy : {"drop_newest", "drop_oldest", "coalesce"}
+            Overflow policy.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid policy: {policy}. Must be one of {POLICIES}.")
+
+        self.maxsize = maxsize
+        self.policy = policy
+
+        # number of items dropped because the queue was full or replaced by a newer
+        # item with the same key, and the deepest the queue has been
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_depth = 0
+
+        self._items = collections.OrderedDict()
+        self._count = itertools.count()
+        self._not_empty = asyncio.Event()
+
+    @property
+    def depth(self):
+        """Number of items in the queue."""
+        return len(self._items)
+
+    def put(self, key, item):
+        """Put an item into the queue.
+
+        Parameters
+        ----------
+        key : hashable or None
+            Key used to coalesce items, or `None` if the item mustn't be coalesced.
+        item : object
+            Item to queue.
+        """
+        if (self.policy == "coalesce") and (key is not None):
+            if key in self._items:
+                del self._items[key]
+                self.coalesced += 1
+        else:
+            key = next(self._count)
+
+        if len(self._items) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == "drop_newest":
+                return
+            self._items.popitem(last=False)
+
+        self._items[key] = item
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._not_empty.set()
+
+    async def get(self):
+        """Remove and return the oldest item, waiting until one is available.
+
+        Returns
+        -------
+        item : object
+            Oldest item in the queue.
+        """
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        return self._items.popitem(last=False)[1]
+
+    def stats(self):
+        """Get queue counters.
+
+        Returns
+        -------
+        stats : dict
+            Current and maximum depth and numbers of dropped and coalesced items.
+        """
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+        }
+
+
+class DaqService:
+    """Bridge between MQTT and the instrument."""
+
+    def __init__(
+        self,
+        mqtthost,
+        queue_size=100,
+        policy="coalesce",
+        outbox_size=1000,
+        stats_interval=10,
+    ):
+        """Construct object.
+
+        Parameters
+        ----------
+        mqtthost : str
+            IP address or hostname for MQTT broker.
+        queue_size : int
+            Maximum number of pending requests.
+        policy : {"drop_newest", "drop_oldest", "coalesce"}
+            Overflow policy for the request queue. With "coalesce", a pending request
+            that sets state is replaced by a newer one setting the same state, see
+            `COALESCE_KEYS`.
+        outbox_size : int
+            Maximum number of messages waiting to be published, also used to bound
+            the paho message queue. Oldest messages are dropped first.
+        stats_interval : float
+            Time between `daq/stats` messages in seconds.
+        """
+        self.mqtthost = mqtthost
+        self.queue_size = queue_size
+        self.policy = policy
+        self.outbox_size = outbox_size
+        self.stats_interval = stats_interval
+
+        self.client_id = f"daq-{uuid.uuid4().hex}"
+
+        # the device task is the only user of the instrument connection
+        self.daq = AsyncXet7019z()
+
+        # config data sent over mqtt
+        self.config = {}
+
+        # continuous mode state and counters
+        self.running = False
+        self.scans = 0
+        self.missed = 0
+        self.publish_failures = 0
+
+        self._loop = None
+        self._requests = None
+        self._outbox = None
+        self._mqttc = None
+
+    async def run(self):
+        """Run the service until cancelled."""
+        self._loop = asyncio.get_running_loop()
+        self._requests = BoundedQueue(self.queue_size, self.policy)
+        self._outbox = BoundedQueue(self.outbox_size, "drop_oldest")
+
+        self._mqttc = mqtt.Client(self.client_id)
+        self._mqttc.max_queued_messages_set(self.outbox_size)
+        self._mqttc.will_set(
+            "daq/status", json.dumps(f"{self.client_id} offline"), 2, retain=True
+        )
+        self._mqttc.on_message = self._on_message
+        self._mqttc.connect(self.mqtthost)
+        self._mqttc.subscribe("measurement/#", qos=2)
+        self._mqttc.subscribe("daq/#", qos=2)
+        self._mqttc.loop_start()
+
+        self.publish("daq/status", json.dumps(f"{self.client_id} ready"), qos=2)
+        print(f"{self.client_id} connected!")
+
+        try:
+            await asyncio.gather(self._device(), self._publisher(), self._reporter())
+        finally:
+            self._mqttc.loop_stop()
+            self._mqttc.disconnect()
+            await self.daq.disconnect()
+
+    def _on_message(self, mqttc, obj, msg):
+        """Hand an MQTT msg to the event loop.
+
+        This method runs in the paho network thread.
+        """
+        key = COALESCE_KEYS.get(msg.topic)
+        self._loop.call_soon_threadsafe(self._requests.put, key, msg)
+
+    def publish(self, topic, payload, qos=0):
+        """Queue a message for publishing.
+
+        Parameters
+        ----------
+        topic : str
+            Topic to publish on.
+        payload : str or bytes
+            Message payload.
+        qos : int
+            MQTT quality of service.
+        """
+        self._outbox.put(topic, (topic, payload, qos))
+
+    async def _publisher(self):
+        """Hand queued messages to paho."""
+        while True:
+            topic, payload, qos = await self._outbox.get()
+            info = self._mqttc.publish(topic, payload, qos)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                self.publish_failures += 1
+
+    async def _reporter(self):
+        """Publish queue depths and drop counters periodically."""
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            stats = {
+                "requests": self._requests.stats(),
+                "outbox": self._outbox.stats(),
+                "publish_failures": self.publish_failures,
+                "scans": self.scans,
+                "missed": self.missed,
+            }
+            self.publish("daq/stats", json.dumps(stats))
+
+    async def _device(self):
+        """Handle requests and run continuous mode scans.
+
+        Continuous mode scans start on a fixed-rate schedule, see
+        `xet7019z.FixedRateScheduler`, with requests handled in the gaps between
+        them. Scans that can't start on time are skipped and counted in `missed`.
+        """
+        scheduler = None
+        batcher = None
+
+        while True:
+            if self.running:
+                if scheduler is None:
+                    # a bad config must stop continuous mode, not the device task
+                    try:
+                        self._check_continuous()
+                        scheduler = FixedRateScheduler(
+                            self.config["daq"]["delay"], None
+                        )
+                        batcher = self._batcher()
+                    except Exception as e:
+                        traceback.print_exc()
+                        self.log(f"Cannot start continuous mode: {e}", 40)
+                        self.running = False
+                        scheduler = batcher = None
+                        continue
+                    scheduler.restart()
+
+                timeout = scheduler.remaining()
+                if timeout <= 0:
+                    missed = scheduler.missed
+                    await self._scan(scheduler, batcher)
+                    self.missed += scheduler.missed - missed
+                    continue
+
+                # publish a batch that's due between scans and wake up when the
+                # next one is
+                if batcher is not None:
+                    batcher.poll()
+                    due = batcher.remaining()
+                    if due is not None:
+                        timeout = min(timeout, due)
+            else:
+                if batcher is not None:
+                    batcher.flush()
+                scheduler = None
+                batcher = None
+                timeout = None
+
+            try:
+                msg = await asyncio.wait_for(self._requests.get(), timeout)
+            except asyncio.TimeoutError:
+                continue
+
+            try:
+                await self._handle(msg)
+            except Exception as e:
+                traceback.print_exc()
+                self.log(f"Failed to handle '{msg.topic}' request: {e}", 40)
+
+    async def _handle(self, msg):
+        """Act on an MQTT msg.
+
+        Parameters
+        ----------
+        msg : paho.mqtt.client.MQTTMessage
+            Request message.
+        """
         payload = json.loads(msg.payload)
 
         print(payload)
 
         # handle continuous start/stop
         if msg.topic == "daq/start":
-            start.append(True)
-            print("Starting continuous mode...")
+            try:
+                self._check_continuous()
+            except ValueError as e:
+                self.log(f"Cannot start continuous mode: {e}", 40)
+            else:
+                self.running = True
+                print("Starting continuous mode...")
         elif msg.topic == "daq/stop":
-            start.append(False)
+            self.running = False
             print("Continuous mode stopped.")
         elif msg.topic == "measurement/log":
             if payload["msg"] == "Run complete!" or payload["msg"].startswith(
                 "RUN ABORTED!"
             ):
-                # make sure continuous mode stops
-                start.append(False)
-
-                # wait for measurement delay + 1s to ensure last measurement
-                # finishes
-                time.sleep(config["daq"]["delay"] + 1)
+                # make sure continuous mode stops, scans run on this task so none
+                # can be in progress
+                self.running = False
                 print(payload["msg"])
         elif msg.topic == "daq/single":
-            if start[0] is False:
-                single()
+            if self.running is False:
+                start = time.time()
+                timestamp, values = await self.daq.measure_all(self._channels())
+                self.handle_data([timestamp] + values, start, time.time())
             else:
-                log(
+                self.log(
                     "Cannot run single measurement: DAQ running in continuous mode.", 30
                 )
         elif msg.topic == "measurement/run":
-            if start[0] is False:
+            if self.running is False:
                 print("Received run message")
-                read_config(payload)
-                setup()
+                self.config = payload["config"]
+                await self.setup()
             else:
-                log("Cannot update config/setup: DAQ running in continuous mode.", 30)
-
-        q.task_done()
-
+                self.log(
+                    "Cannot update config/setup: DAQ running in continuous mode.", 30
+                )
 
-def continuous():
-    """Measure data in continuous mode.
+    def _check_continuous(self):
+        """Check the config has the settings continuous mode needs.
+
+        Raises
+        ------
+        ValueError
+            If no DAQ config has been received with a `measurement/run` request, or
+            it has no channels or a scan delay that isn't > 0.
+        """
+        if "daq" not in self.config:
+            raise ValueError("No DAQ config, send a 'measurement/run' request first.")
+
+        delay = self.config["daq"].get("delay")
+        if not isinstance(delay, (int, float)) or delay <= 0:
+            raise ValueError(f"Invalid delay: {delay}. Must be > 0.")
+
+        if not self.config["daq"].get("channels"):
+            raise ValueError("No channels in the DAQ config.")
+
+    def _channels(self):
+        """Get the channels in use.
+
+        Returns
+        -------
+        channels : list of int
+            Channels in use, 0-indexed.
+        """
+        return [int(channel) for channel in self.config["daq"]["channels"]]
+
+    def _batcher(self):
+        """Create a batcher for continuous mode, if enabled in the config.
+
+        Returns
+        -------
+        batcher : ScanBatcher or None
+            Batcher that publishes binary messages, or `None` to publish each scan
+            as JSON.
+        """
+        batch = self.config["daq"].get("batch", 0)
+        if batch > 0:
+            channels = self._channels()
+            ranges = {
+                int(channel): ai_range
+                for channel, ai_range in self.config["daq"]["channels"].items()
+            }
+            ai_ranges = [ranges[channel] for channel in channels]
+            return ScanBatcher(
+                lambda payload: self.publish("data/raw/daq/batch", payload),
+                channels,
+                ai_ranges,
+                batch,
+                self.config["daq"].get("batch_age", 1),
+                self.config["daq"].get("batch_dtype", "float32"),
+                self.daq.data_format,
+            )
 
-    This function runs in its own thread.
-    """
-    while True:
-        if start[0] is True:
-            single()
-            time.sleep(config["daq"]["delay"])
+    async def _scan(self, scheduler, batcher):
+        """Run a continuous mode scan for the next tick of the schedule.
+
+        Parameters
+        ----------
+        scheduler : xet7019z.FixedRateScheduler
+            Schedule of the scans, which the scan is recorded in.
+        batcher : ScanBatcher or None
+            Batcher for the scan or `None` to publish it as JSON.
+        """
+        start = time.perf_counter()
+        try:
+            if (batcher is not None) and (batcher.dtype == "int16"):
+                timestamp, values, _ = await self.daq.measure_raw(self._channels())
+            else:
+                timestamp, values = await self.daq.measure_all(self._channels())
+        except Exception as e:
+            scheduler.record(start, time.perf_counter(), None)
+            traceback.print_exc()
+            self.log(f"Continuous mode scan failed! {e}", 40)
+            return
+        record = scheduler.record(start, time.perf_counter(), values)
+
+        self.scans += 1
+        if batcher is not None:
+            batcher.append(record.start, values)
         else:
-            time.sleep(1)
-
-
-def single():
-    """Perform single shot measurement."""
-    data = [time.time()]
-    for channel in config["daq"]["channels"].keys():
-        data.extend([daq.measure(channel)])
-    handle_data(data)
-
-
-def handle_data(data):
-    """Handle measurement data.
-
-    Parameters
-    ----------
-    data : array-like
-        Measurement data.
-    """
-    payload = {
-        "data": data,
-        "pixel": {},
-        "sweep": "",
-    }
-    mqttqp.append_payload("data/raw/daq", json.dumps(payload))
-
-
-def log(msg, level):
-    """Publish info for logging.
-
-    Parameters
-    ----------
-    msg : str
-        Log message.
-    level : int
-        Log level used by logging module:
-
-            * 50 : CRITICAL
-            * 40 : ERROR
-            * 30 : WARNING
-            * 20 : INFO
-            * 10 : DEBUG
-            * 0 : NOTSET
-    """
-    payload = {"level": level, "msg": msg}
-    mqttqp.append_payload("measurement/log", json.dumps(payload))
-
-
-def read_config(payload):
-    """Get config data from payload.
+            self.handle_data([timestamp] + values, record.start, record.end)
+
+    def handle_data(self, data, start=None, end=None):
+        """Handle measurement data.
+
+        Parameters
+        ----------
+        data : array-like
+            Measurement data.
+        start, end : float, optional
+            Times the measurement started and finished, in seconds since the epoch.
+        """
+        payload = {
+            "data": data,
+            "start": start,
+            "end": end,
+            "pixel": {},
+            "sweep": "",
+        }
+        self.publish("data/raw/daq", json.dumps(payload))
+
+    def log(self, msg, level):
+        """Publish info for logging.
+
+        Parameters
+        ----------
+        msg : str
+            Log message.
+        level : int
+            Log level used by logging module:
+
+                * 50 : CRITICAL
+                * 40 : ERROR
+                * 30 : WARNING
+                * 20 : INFO
+                * 10 : DEBUG
+                * 0 : NOTSET
+        """
+        payload = {"level": level, "msg": msg}
+        self.publish("measurement/log", json.dumps(payload))
+
+    async def setup(self):
+        """Set up the instrument for measurements."""
+        try:
+            if not self.daq.instr.is_open:
+                await self.daq.connect(
+                    self.config["daq"]["host"],
+                    self.config["daq"]["port"],
+                    self.config["daq"]["timeout"],
+                    True,
+                )
 
-    Parameters
-    ----------
-    payload : dict
-        Request dictionary for measurement server.
-    """
-    global config
-    config = payload["config"]
-
-
-def setup():
-    """Set up the instrument for measurements."""
-    try:
-        if daq.instr is None:
-            daq.connect(
-                config["daq"]["host"],
-                config["daq"]["port"],
-                config["daq"]["timeout"],
-                True,
+            print(f"Connected to '{await self.daq.get_id()}'!")
+
+            # enable only the analog inputs in use and apply their ranges and the
+            # global settings, writing only what differs
+            channels = {
+                int(channel): ai_range
+                for channel, ai_range in self.config["daq"]["channels"].items()
+            }
+            await self.daq.apply_config(
+                ranges=channels,
+                enabled={
+                    channel: channel in channels
+                    for channel in range(self.daq.ai_channels)
+                },
+                plf=self.config["daq"]["plf"],
+                cjc=True,
             )
-
-        print(f"Connected to '{daq.get_id()}'!")
-
-        # disable all analog inputs
-        for channel in range(10):
-            daq.enable_ai(channel, False)
-
-        # global settings
-        daq.set_ai_noise_filter(config["daq"]["plf"])
-        daq.enable_cjc(True)
-
-        # setup and enable the analog inputs in use
-        for channel, ai_range in config["daq"]["channels"].items():
-            daq.set_ai_range(channel, ai_range)
-            daq.enable_ai(channel, True)
-    except Exception as e:
-        traceback.print_exc()
-        log("DAQ setup failed! " + str(e), 40)
-
-
-def on_message(mqttc, obj, msg):
-    """Act on an MQTT msg."""
-    q.put_nowait(msg)
-
-
-# start thread for managing queue tasks
-threading.Thread(target=worker, daemon=True).start()
-
-# start thread for measurement tasks
-threading.Thread(target=continuous, daemon=True).start()
-
-# create mqtt client
-client_id = f"daq-{uuid.uuid4().hex}"
-mqttc = mqtt.Client(client_id)
-mqttc.will_set("daq/status", json.dumps(f"{client_id} offline"), 2, retain=True)
-mqttc.on_message = on_message
-mqttc.connect(args.mqtthost)
-mqttc.subscribe("measurement/#", qos=2)
-mqttc.subscribe("daq/#", qos=2)
-publish.single(
-    "daq/status",
-    json.dumps(f"{client_id} ready"),
-    qos=2,
-    hostname=args.mqtthost,
-)
-print(f"{client_id} connected!")
-mqttc.loop_forever()
+        except Exception as e:
+            traceback.print_exc()
+            self.log("DAQ setup failed! " + str(e), 40)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "-mqtthost",
+        type=str,
+        default="127.0.0.1",
+        help="IP address or hostname for MQTT broker.",
+    )
+    parser.add_argument(
+        "-queue_size",
+        type=int,
+        default=100,
+        help="Maximum number of pending requests.",
+    )
+    parser.add_argument(
+        "-policy",
+        type=str,
+        default="coalesce",
+        choices=POLICIES,
+        help="Overflow policy for the request queue.",
+    )
+    parser.add_argument(
+        "-outbox_size",
+        type=int,
+        default=1000,
+        help="Maximum number of messages waiting to be published.",
+    )
+    parser.add_argument(
+        "-stats_interval",
+        type=float,
+        default=10,
+        help="Time between queue statistics messages in seconds.",
+    )
+
+    args = parser.parse_args()
+
+    service = DaqService(
+        args.mqtthost,
+        args.queue_size,
+        args.policy,
+        args.outbox_size,
+        args.stats_interval,
+    )
+    asyncio.run(service.run())
@@ -0,0 +1,272 @@
+"""Compact binary encoding of batches of scans for MQTT payloads.
+
+A batch is packed as a fixed little-endian layout:
+
+    header      magic (2s) "XS", version (B), dtype code (B), data format code (B),
+                number of channels (B), number of scans (H)
+    channels    channel number of each column (B * number of channels)
+    ai ranges   AI range setting of each column (B * number of channels)
+    timestamps  scan start times in seconds since the epoch (d * number of scans)
+    values      scan values, one row per scan (dtype * scans * channels)
+
+Values are float32 engineering units or int16 raw ADC counts as returned by
+`measure_raw`. Raw counts are converted with `xet7019z.adc_to_eng`, using the AI
+ranges and the data format the counts were acquired in.
+"""
+
+import collections
+import struct
+import time
+
+import numpy as np
+
+MAGIC = b"XS"
+VERSION = 2
+
+HEADER = struct.Struct("<2sBBBBH")
+
+DTYPES = {0: np.dtype("<f4"), 1: np.dtype("<i2")}
+DTYPE_CODES = {"float32": 0, "int16": 1}
+
+DATA_FORMATS = {0: "hex", 1: "eng"}
+DATA_FORMAT_CODES = {"hex": 0, "eng": 1}
+
+Batch = collections.namedtuple(
+    "Batch", ["channels", "ai_ranges", "data_format", "timestamps", "values"]
+)
+Batch.__doc__ = """Batch of scans unpacked from a binary payload.
+
+Attributes
+----------
+channels : list of int
+    Channel number of each column of `values`.
+ai_ranges : list of int
+    AI range setting of each column of `values`.
+data_format : str
+    AI data format of the instrument, "hex" or "eng".
+timestamps : numpy.ndarray of float64
+    Scan start times in seconds since the epoch.
+values : numpy.ndarray of float32 or int16
+    Scan values with one row per scan and one column per channel.
+"""
+
+
+def encode(channels, ai_ranges, timestamps, values, dtype="float32", data_format="hex"):
+    """Pack a batch of scans into a binary payload.
+
+    Parameters
+    ----------
+    channels : list of int
+        Channel number of each column of `values`.
+    ai_ranges : list of int
+        AI range setting of each column of `values`.
+    timestamps : array-like of float
+        Scan start times in seconds since the epoch.
+    values : array-like
+        Scan values with one row per scan and one column per channel, engineering
+        units for "float32" or raw ADC counts for "int16".
+    dtype : {"float32", "int16"}
+        Data type used to pack the values.
+    data_format : {"hex", "eng"}
+        AI data format of the instrument.
+
+    Returns
+    -------
+    payload : bytes
+        Binary payload.
+    """
+    if dtype not in DTYPE_CODES:
+        raise ValueError(
+            f"Invalid dtype: {dtype}. Must be one of {list(DTYPE_CODES.keys())}."
+        )
+    code = DTYPE_CODES[dtype]
+    if data_format not in DATA_FORMAT_CODES:
+        raise ValueError(
+            f"Invalid AI data format: {data_format}. Must be 'hex' or 'eng'."
+        )
+    if len(ai_ranges) != len(channels):
+        raise ValueError(f"{len(ai_ranges)} AI ranges for {len(channels)} channels.")
+
+    timestamps = np.asarray(timestamps, dtype="<f8")
+    values = np.asarray(values, dtype=DTYPES[code]).reshape(len(timestamps), -1)
+    if values.shape[1] != len(channels):
+        raise ValueError(
+            f"Values have {values.shape[1]} columns for {len(channels)} channels."
+        )
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        code,
+        DATA_FORMAT_CODES[data_format],
+        len(channels),
+        len(timestamps),
+    )
+
+    return b"".join(
+        [
+            header,
+            bytes(channels),
+            bytes(ai_ranges),
+            timestamps.tobytes(),
+            values.tobytes(),
+        ]
+    )
+
+
+def decode(payload):
+    """Unpack a binary payload into a batch of scans.
+
+    Parameters
+    ----------
+    payload : bytes-like
+        Binary payload created by `encode`.
+
+    Returns
+    -------
+    batch : Batch
+        Channels, AI ranges, data format, timestamps and values of the batch.
+    """
+    magic, version, code, format_code, n_channels, n_scans = HEADER.unpack_from(payload)
+    if (magic != MAGIC) or (version != VERSION):
+        raise ValueError(f"Unsupported payload: magic {magic}, version {version}.")
+    if code not in DTYPES:
+        raise ValueError(f"Unsupported payload dtype code: {code}.")
+    if format_code not in DATA_FORMATS:
+        raise ValueError(f"Unsupported payload data format code: {format_code}.")
+
+    offset = HEADER.size
+    channels = list(payload[offset : offset + n_channels])
+    offset += n_channels
+    ai_ranges = list(payload[offset : offset + n_channels])
+    offset += n_channels
+
+    timestamps = np.frombuffer(payload, dtype="<f8", count=n_scans, offset=offset)
+    offset += timestamps.nbytes
+
+    values = np.frombuffer(
+        payload, dtype=DTYPES[code], count=n_scans * n_channels, offset=offset
+    ).reshape(n_scans, n_channels)
+
+    return Batch(channels, ai_ranges, DATA_FORMATS[format_code], timestamps, values)
+
+
+class ScanBatcher:
+    """Collect scans and publish them in batches.
+
+    A batch is published once it holds `max_scans` scans or its oldest scan is
+    `max_age` seconds old, whichever comes first. `append` checks the age of the
+    batch, but between scans `poll` must be called after `remaining` seconds to
+    publish a batch that's due.
+    """
+
+    def __init__(
+        self,
+        publish,
+        channels,
+        ai_ranges,
+        max_scans=100,
+        max_age=1,
+        dtype="float32",
+        data_format="hex",
+    ):
+        """Construct object.
+
+        Parameters
+        ----------
+        publish : callable
+            Function called with the binary payload of each batch.
+        channels : list of int
+            Channel number of each value in a scan.
+        ai_ranges : list of int
+            AI range setting of each channel.
+        max_scans : int
+            Maximum number of scans in a batch.
+        max_age : float
+            Maximum time in seconds a scan waits in a batch before it's published.
+        dtype : {"float32", "int16"}
+            Data type used to pack the values: "float32" for values in engineering
+            units, or "int16" for raw ADC counts, see `encode`.
+        data_format : {"hex", "eng"}
+            AI data format of the instrument.
+        """
+        if dtype not in DTYPE_CODES:
+            raise ValueError(
+                f"Invalid dtype: {dtype}. Must be one of {list(DTYPE_CODES.keys())}."
+            )
+
+        self.publish = publish
+        self.channels = [int(channel) for channel in channels]
+        self.ai_ranges = [int(ai_range) for ai_range in ai_ranges]
+        self.max_scans = max_scans
+        self.max_age = max_age
+        self.dtype = dtype
+        self.data_format = data_format
+
+        # values are held in the packed data type so raw counts are stored exactly
+        self._timestamps = np.zeros(max_scans)
+        self._values = np.zeros(
+            (max_scans, len(self.channels)), dtype=DTYPES[DTYPE_CODES[dtype]]
+        )
+        self._n = 0
+        self._first = None
+
+    def append(self, timestamp, values):
+        """Add a scan to the batch, publishing the batch if it's full or due.
+
+        Parameters
+        ----------
+        timestamp : float
+            Scan timestamp in seconds since the epoch.
+        values : array-like
+            Scan values, one per channel, in engineering units for "float32" or raw
+            ADC counts for "int16".
+        """
+        if self._n == 0:
+            self._first = time.monotonic()
+
+        self._timestamps[self._n] = timestamp
+        self._values[self._n] = values
+        self._n += 1
+
+        if self._n >= self.max_scans:
+            self.flush()
+        else:
+            self.poll()
+
+    def remaining(self):
+        """Get the time until the batch is due to be published.
+
+        Returns
+        -------
+        remaining : float or None
+            Time in seconds, 0 or less if the batch is due, or `None` if the batch is
+            empty.
+        """
+        if self._n == 0:
+            return None
+
+        return self._first + self.max_age - time.monotonic()
+
+    def poll(self):
+        """Publish the batch if its oldest scan has reached `max_age`."""
+        if (self._n > 0) and (time.monotonic() - self._first >= self.max_age):
+            self.flush()
+
+    def flush(self):
+        """Publish any scans in the batch."""
+        if self._n == 0:
+            return
+
+        payload = encode(
+            self.channels,
+            self.ai_ranges,
+            self._timestamps[: self._n],
+            self._values[: self._n],
+            self.dtype,
+            self.data_format,
+        )
+        self._n = 0
+        self._first = None
+
+        self.publish(payload)
@@ -6,4 +6,13 @@ try:
 except DistributionNotFound:
     __version__ = "0.0.0"
 
-from .pet7019z import *
+from .xet7019z import *
+from .acquisition import Acquisition
+from .aio import AsyncXet7019z
+from .connection import DeviceUnavailableError, ResilientClient
+from .fleet import Fleet, FleetScan
+from .streaming import BlockReducer, RunningStats
+from .scheduler import FixedRateScheduler, ScanRecord
+from .shared import SharedClient
+from .transport import ModbusTransport
+from .registers import REGISTER_MAP, plan_reads
@@ -0,0 +1,254 @@
+"""Continuous background acquisition for the PET-7019Z/ET-7019Z."""
+
+import threading
+
+import numpy as np
+
+from .scheduler import FixedRateScheduler
+from .xet7019z import adc_to_eng
+
+
+class Acquisition:
+    """Poll AI channels on a background thread into a preallocated ring buffer.
+
+    Raw ADC counts and timestamps are stored in fixed-size arrays so long runs use a
+    constant amount of memory. Consumers read the buffer with `read_latest` or `drain`,
+    which return views into the buffer rather than copies.
+
+    While acquisition is running, the acquisition thread is the only user of the
+    instrument connection.
+    """
+
+    def __enter__(self):
+        """Enter the runtime context related to this object."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context related to this object.
+
+        Make sure the acquisition thread gets stopped.
+        """
+        self.stop()
+
+    def __init__(self, daq, channels=None, capacity=100000, period=0, retry_delay=0.1):
+        """Construct object.
+
+        Parameters
+        ----------
+        daq : xet7019z
+            Connected instrument object.
+        channels : list of int, optional
+            Channels to acquire, 0-indexed. If `None`, all channels are acquired.
+        capacity : int
+            Number of scans held in the ring buffer.
+        period : float
+            Time between scan starts in seconds, kept on a fixed-rate schedule that
+            doesn't drift. If 0, scans are acquired as fast as the instrument
+            responds.
+        retry_delay : float
+            Time to wait after a failed scan before trying again in seconds, when
+            `period` is 0, so a lost connection doesn't keep the thread busy.
+        """
+        self.daq = daq
+        if channels is None:
+            channels = range(daq.ai_channels)
+        self.channels = list(channels)
+        self.capacity = capacity
+        self.period = period
+        self.retry_delay = retry_delay
+
+        # each scan is stored twice, `capacity` rows apart, so that any window of up
+        # to `capacity` consecutive scans is contiguous and can be returned as a view
+        self._counts = np.zeros((2 * capacity, len(self.channels)), dtype=np.int16)
+        self._timestamps = np.zeros(2 * capacity)
+
+        # total number of scans written by the acquisition thread and consumed by
+        # `drain`
+        self._written = 0
+        self._read = 0
+
+        # number of scans overwritten before they could be drained
+        self.overruns = 0
+
+        # number of failed scans and the most recent failure
+        self.errors = 0
+        self.last_error = None
+
+        # number of scheduled scans skipped because a scan overran its period
+        self.missed = 0
+
+        # AI range settings in effect for each acquired channel and the AI data
+        # format of the counts
+        self.ai_ranges = None
+        self.data_format = None
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._scheduler = None
+
+    @property
+    def running(self):
+        """Acquisition thread is running."""
+        return (self._thread is not None) and self._thread.is_alive()
+
+    def start(self):
+        """Start acquiring on a background thread."""
+        if self.running:
+            raise RuntimeError("Acquisition is already running.")
+
+        ai_ranges = self.daq.refresh_ai_ranges()
+        self.ai_ranges = np.array([ai_ranges[ch] for ch in self.channels])
+        self.data_format = self.daq.data_format
+
+        self._stop.clear()
+        if self.period > 0:
+            self._scheduler = FixedRateScheduler(self.period, self._scan)
+        else:
+            self._scheduler = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop acquiring and wait for the acquisition thread to finish."""
+        self._stop.set()
+        if self._scheduler is not None:
+            self._scheduler.stop()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._scheduler is not None:
+            self.missed = self._scheduler.missed
+
+    def _run(self):
+        """Acquire scans until stopped.
+
+        This method runs in its own thread.
+        """
+        if self._scheduler is not None:
+            self._scheduler.run(until=self._stop.is_set)
+        else:
+            while not self._stop.is_set():
+                if not self._scan():
+                    self._stop.wait(self.retry_delay)
+
+    def _scan(self):
+        """Acquire a scan into the ring buffer.
+
+        Returns
+        -------
+        success : bool
+            `True` if the scan was acquired.
+        """
+        try:
+            timestamp, counts, ai_ranges = self.daq.measure_raw(self.channels)
+        except Exception as e:
+            self.errors += 1
+            self.last_error = e
+            success = False
+        else:
+            success = True
+            self.ai_ranges = ai_ranges
+
+            row = self._written % self.capacity
+            self._counts[row] = counts
+            self._counts[row + self.capacity] = counts
+            self._timestamps[row] = timestamp
+            self._timestamps[row + self.capacity] = timestamp
+
+            with self._lock:
+                self._written += 1
+
+        if self._scheduler is not None:
+            self.missed = self._scheduler.missed
+
+        return success
+
+    def _window(self, start, n):
+        """Get views of `n` consecutive scans starting from scan number `start`.
+
+        Parameters
+        ----------
+        start : int
+            Scan number of the first scan in the window.
+        n : int
+            Number of scans in the window, at most `capacity`.
+
+        Returns
+        -------
+        timestamps : numpy.ndarray of float64
+            View of scan timestamps in seconds since the epoch.
+        counts : numpy.ndarray of int16
+            View of raw ADC counts with one column per acquired channel.
+        """
+        row = start % self.capacity
+
+        return self._timestamps[row : row + n], self._counts[row : row + n]
+
+    def read_latest(self, n):
+        """Get the most recent scans.
+
+        The returned arrays are views into the ring buffer so they get overwritten
+        once another `capacity` scans have been acquired. Copy them to keep them.
+
+        Parameters
+        ----------
+        n : int
+            Maximum number of scans to return.
+
+        Returns
+        -------
+        timestamps : numpy.ndarray of float64
+            View of scan timestamps in seconds since the epoch.
+        counts : numpy.ndarray of int16
+            View of raw ADC counts with one column per acquired channel.
+        """
+        with self._lock:
+            written = self._written
+
+        n = min(n, written, self.capacity)
+
+        return self._window(written - n, n)
+
+    def drain(self):
+        """Get all scans acquired since the previous call.
+
+        The returned arrays are views into the ring buffer so they get overwritten
+        once another `capacity` scans have been acquired. Copy them to keep them.
+        Scans that were overwritten before they could be drained are counted in
+        `overruns`.
+
+        Returns
+        -------
+        timestamps : numpy.ndarray of float64
+            View of scan timestamps in seconds since the epoch.
+        counts : numpy.ndarray of int16
+            View of raw ADC counts with one column per acquired channel.
+        """
+        with self._lock:
+            written = self._written
+
+        n = written - self._read
+        if n > self.capacity:
+            self.overruns += n - self.capacity
+            n = self.capacity
+
+        self._read = written
+
+        return self._window(written - n, n)
+
+    def to_eng(self, counts):
+        """Convert raw ADC counts from the buffer to engineering units.
+
+        Parameters
+        ----------
+        counts : array-like of int16
+            Raw ADC counts with one column per acquired channel.
+
+        Returns
+        -------
+        eng : numpy.ndarray of float64
+            Values in engineering units.
+        """
+        return adc_to_eng(counts, self.ai_ranges, self.data_format)
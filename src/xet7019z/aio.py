@@ -0,0 +1,720 @@
+"""asyncio client for the ICP DAS PET-7019Z/ET-7019Z analog input DAQ."""
+
+import asyncio
+import time
+import warnings
+
+import numpy as np
+
+from . import modbus
+from .registers import CONFIG_FIELDS, REGISTER_MAP, decode_fields, plan_reads
+from .xet7019z import (
+    Identity,
+    _count_to_eng,
+    _twos_complement,
+    adc_to_eng,
+    xet7019z,
+)
+
+
+class AsyncModbusClient:
+    """Non-blocking Modbus TCP client.
+
+    Responses are matched to requests by MBAP transaction identifier, so several
+    requests can be outstanding on the connection at once, up to `max_in_flight`.
+    Errors are raised as exceptions rather than returned as `None`.
+    """
+
+    def __init__(self, host=None, port=502, unit_id=1, timeout=30, max_in_flight=1):
+        """Construct object.
+
+        Parameters
+        ----------
+        host : str, optional
+            Server host.
+        port : int
+            Server port.
+        unit_id : int
+            Modbus unit identifier.
+        timeout : float
+            Connection and response timeout in seconds.
+        max_in_flight : int
+            Maximum number of requests awaiting a response at the same time. Many
+            devices process one request at a time, so the default is 1.
+        """
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        self._pending = {}
+        self._transaction_id = 0
+        self._in_flight = None
+
+    @property
+    def is_open(self):
+        """Connection is open."""
+        return self._writer is not None
+
+    async def open(self):
+        """Open the connection."""
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._read_task = asyncio.ensure_future(self._read_responses())
+
+    async def close(self):
+        """Close the connection."""
+        if self._writer is None:
+            return
+
+        self._read_task.cancel()
+        self._writer.close()
+        self._writer = None
+        self._reader = None
+        self._fail_pending(ConnectionError("Connection closed."))
+
+    def _fail_pending(self, exc):
+        """Fail all requests awaiting a response.
+
+        Parameters
+        ----------
+        exc : Exception
+            Exception to raise in the waiting tasks.
+        """
+        for future, _, _ in self._pending.values():
+            if not future.done():
+                future.set_exception(exc)
+        self._pending.clear()
+
+    async def _read_responses(self):
+        """Read response frames and hand them to the waiting requests.
+
+        This coroutine runs as its own task while the connection is open.
+        """
+        try:
+            while True:
+                header = await self._reader.readexactly(modbus.MBAP_HEADER.size)
+                transaction_id, protocol_id, length, _ = modbus.MBAP_HEADER.unpack(
+                    header
+                )
+                modbus.check_header(protocol_id, length)
+                pdu = await self._reader.readexactly(length - 1)
+
+                try:
+                    future, function_code, count = self._pending.pop(transaction_id)
+                except KeyError:
+                    # response to a request that has already timed out
+                    continue
+
+                if future.done():
+                    continue
+
+                try:
+                    future.set_result(modbus.parse_pdu(function_code, pdu, count))
+                except modbus.ModbusError as e:
+                    future.set_exception(e)
+        except (
+            asyncio.IncompleteReadError,
+            ConnectionError,
+            OSError,
+            modbus.ModbusError,
+        ) as e:
+            # close the transport so the socket isn't left open until it's collected
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+            self._fail_pending(ConnectionError(f"Connection lost: {e}"))
+
+    async def _request(self, function_code, address, value, count=None):
+        """Send a request and wait for its response.
+
+        Parameters
+        ----------
+        function_code : int
+            Modbus function code.
+        address : int
+            Start address.
+        value : int, bool or list
+            See `modbus.build_pdu`.
+        count : int, optional
+            Number of coils or registers requested by a read, used to check the
+            response.
+
+        Returns
+        -------
+        result : list of bool, list of int or bool
+            See `modbus.parse_pdu`.
+        """
+        if self._writer is None:
+            raise ConnectionError("Connection is not open.")
+
+        async with self._in_flight:
+            self._transaction_id = (self._transaction_id + 1) % 0x10000
+            transaction_id = self._transaction_id
+
+            future = asyncio.get_event_loop().create_future()
+            self._pending[transaction_id] = (future, function_code, count)
+
+            self._writer.write(
+                modbus.build_request(
+                    transaction_id, self.unit_id, function_code, address, value
+                )
+            )
+
+            try:
+                return await asyncio.wait_for(future, self.timeout)
+            finally:
+                self._pending.pop(transaction_id, None)
+
+    async def read_coils(self, address, count=1):
+        """Read coils (function code 1)."""
+        return await self._request(modbus.READ_COILS, address, count, count)
+
+    async def read_discrete_inputs(self, address, count=1):
+        """Read discrete inputs (function code 2)."""
+        return await self._request(modbus.READ_DISCRETE_INPUTS, address, count, count)
+
+    async def read_holding_registers(self, address, count=1):
+        """Read holding registers (function code 3)."""
+        return await self._request(modbus.READ_HOLDING_REGISTERS, address, count, count)
+
+    async def read_input_registers(self, address, count=1):
+        """Read input registers (function code 4)."""
+        return await self._request(modbus.READ_INPUT_REGISTERS, address, count, count)
+
+    async def write_single_coil(self, address, value):
+        """Write a single coil (function code 5)."""
+        return await self._request(modbus.WRITE_SINGLE_COIL, address, value)
+
+    async def write_single_register(self, address, value):
+        """Write a single register (function code 6)."""
+        return await self._request(modbus.WRITE_SINGLE_REGISTER, address, value)
+
+    async def write_multiple_coils(self, address, values):
+        """Write multiple coils (function code 15)."""
+        return await self._request(modbus.WRITE_MULTIPLE_COILS, address, list(values))
+
+    async def write_multiple_registers(self, address, values):
+        """Write multiple registers (function code 16)."""
+        return await self._request(
+            modbus.WRITE_MULTIPLE_REGISTERS, address, list(values)
+        )
+
+
+class AsyncXet7019z:
+    """ICP DAS PET-7019Z/ET-7019Z analog input DAQ instrument using asyncio.
+
+    This has the same API as `xet7019z` but all instrument methods are coroutines,
+    so one event loop can poll many instruments concurrently. See `xet7019z` for
+    details of the settings.
+    """
+
+    ai_channels = xet7019z.ai_channels
+    ai_ranges = xet7019z.ai_ranges
+    ai_units_per_count = xet7019z.ai_units_per_count
+    ai_offsets = xet7019z.ai_offsets
+    ai_unsigned = xet7019z.ai_unsigned
+    ai_eng_units_per_count = xet7019z.ai_eng_units_per_count
+
+    # configuration validation and write planning, which don't make requests
+    _config_snapshot = xet7019z._config_snapshot
+    _fill_ai_range_cache = xet7019z._fill_ai_range_cache
+    _config_request = xet7019z._config_request
+    _plan_config = xet7019z._plan_config
+    _channel_dict = xet7019z._channel_dict
+    _changed_span = xet7019z._changed_span
+    _plan_register_write = xet7019z._plan_register_write
+    _plan_coil_write = xet7019z._plan_coil_write
+
+    async def __aenter__(self):
+        """Enter the runtime context related to this object."""
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context related to this object.
+
+        Make sure everything gets cleaned up properly.
+        """
+        await self.disconnect()
+
+    def __init__(self, ai_range_verify_interval=None):
+        """Construct object.
+
+        Parameters
+        ----------
+        ai_range_verify_interval : float, optional
+            See `xet7019z`.
+        """
+        self.instr = AsyncModbusClient()
+
+        self.ai_range_verify_interval = ai_range_verify_interval
+        self._ai_range_cache = {}
+        self._ai_range_cache_time = None
+        self._ai_range_connections = None
+
+        self._identity = None
+
+        # AI data format set on the instrument
+        self.data_format = "hex"
+
+    async def connect(self, host, port=502, timeout=30, reset=True, data_format="hex"):
+        """Connect to the instrument.
+
+        Parameters
+        ----------
+        host : str
+            Instrument host.
+        port : int
+            Instrument port. Default for Modbus is 502.
+        timeout : float
+            Comms timeout in seconds.
+        reset : bool, optional
+            Reset the instrument to the built-in default configuration.
+        data_format : str, optional
+            AI data format to use, hexadecimal ("hex") or engineering unit ("eng").
+        """
+        if self.instr.is_open:
+            warnings.warn(
+                "A connection is already open. It will be closed before the new connection is established."
+            )
+            await self.instr.close()
+
+        self.instr.host = host
+        self.instr.port = port
+        self.instr.timeout = timeout
+        await self.instr.open()
+
+        # cached settings may belong to a different instrument
+        self.invalidate_ai_ranges()
+        self._identity = None
+
+        if reset is True:
+            await self.reset()
+
+        await self.set_ai_data_format(data_format)
+
+    async def disconnect(self):
+        """Disconnect the instrument."""
+        await self.instr.close()
+        self._identity = None
+
+    async def get_id(self):
+        """Get instrument identity string.
+
+        Returns
+        -------
+        id : str
+            Identification string formatted as: '[manufacturer], [model], [os version],
+            [firmware version], [I/O version]'.
+        """
+        return str(await self.get_identity())
+
+    async def get_identity(self):
+        """Get instrument identity.
+
+        The identity is cached until the connection is re-established.
+
+        Returns
+        -------
+        identity : Identity
+            Manufacturer, model, OS version, firmware version and I/O version.
+        """
+        if self._identity is None:
+            values = await self.read_fields(
+                ["model", "os_version", "fw_version", "io_version"]
+            )
+
+            self._identity = Identity(
+                "ICP DAS",
+                values["model"],
+                values["os_version"],
+                values["fw_version"],
+                values["io_version"],
+            )
+
+        return self._identity
+
+    async def read_fields(self, names):
+        """Read several fields of the register map with the fewest Modbus requests.
+
+        The planned requests are made concurrently, see `xet7019z.read_fields`.
+
+        Parameters
+        ----------
+        names : list of str
+            Names of fields in `registers.REGISTER_MAP`.
+
+        Returns
+        -------
+        values : dict
+            Decoded values keyed by field name.
+        """
+        requests = plan_reads(names)
+        results = await asyncio.gather(
+            *[
+                getattr(self.instr, request.method)(request.address, request.count)
+                for request in requests
+            ]
+        )
+
+        return decode_fields(names, requests, results)
+
+    async def reset(self):
+        """Reset the instrument to the factory default configuration.
+
+        This method only affects I/O settings, preserving calibration settings.
+        """
+        await self.instr.write_single_coil(REGISTER_MAP["reset"].address, True)
+
+        # ranges have reverted to defaults so re-read them when next needed
+        self.invalidate_ai_ranges()
+
+    async def set_ai_range(self, channel, ai_range):
+        """Set an AI range.
+
+        Parameters
+        ---------
+        channel : int
+            Channel to set, 0-indexed.
+        ai_range : int
+            Range setting integer. See `xet7019z.set_ai_range`.
+        """
+        await self.instr.write_single_register(
+            REGISTER_MAP["ai_ranges"].address + channel, ai_range
+        )
+        self._ai_range_cache[channel] = ai_range
+
+    async def get_ai_range(self, channel):
+        """Get an AI range.
+
+        Parameters
+        ---------
+        channel : int
+            Channel to get, 0-indexed.
+
+        Returns
+        -------
+        ai_range : int
+            Range setting integer. See `xet7019z.get_ai_range`.
+        """
+        ai_range = (
+            await self.instr.read_holding_registers(
+                REGISTER_MAP["ai_ranges"].address + channel, 1
+            )
+        )[0]
+        self._ai_range_cache[channel] = ai_range
+
+        return ai_range
+
+    async def refresh_ai_ranges(self):
+        """Read the AI ranges of all channels into the range cache.
+
+        Returns
+        -------
+        ai_ranges : list of int
+            Range setting integers of all channels.
+        """
+        ai_ranges = (await self.read_fields(["ai_ranges"]))["ai_ranges"]
+        self._fill_ai_range_cache(ai_ranges)
+
+        return list(ai_ranges)
+
+    def invalidate_ai_ranges(self):
+        """Clear the AI range cache."""
+        self._ai_range_cache = {}
+        self._ai_range_cache_time = None
+
+    async def _cached_ai_range(self, channel):
+        """Get an AI range from the range cache.
+
+        Parameters
+        ---------
+        channel : int
+            Channel to get, 0-indexed.
+
+        Returns
+        -------
+        ai_range : int
+            Range setting integer.
+        """
+        if (self.ai_range_verify_interval is not None) and (
+            (self._ai_range_cache_time is None)
+            or (
+                time.monotonic() - self._ai_range_cache_time
+                > self.ai_range_verify_interval
+            )
+        ):
+            await self.refresh_ai_ranges()
+        elif channel not in self._ai_range_cache:
+            await self.refresh_ai_ranges()
+
+        return self._ai_range_cache[channel]
+
+    async def measure(self, channel):
+        """Get measurement value for a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to measure, 0-indexed.
+
+        Returns
+        -------
+        eng : float
+            Value in engineering units.
+        """
+        value = (
+            await self.instr.read_input_registers(
+                REGISTER_MAP["ai"].address + channel, 1
+            )
+        )[0]
+        ai_range = await self._cached_ai_range(channel)
+
+        return _count_to_eng(value, ai_range, self.data_format)
+
+    async def measure_all(self, channels=None):
+        """Get measurement values for several channels in a single scan.
+
+        Parameters
+        ----------
+        channels : list of int, optional
+            Channels to measure, 0-indexed. If `None`, all channels are measured.
+
+        Returns
+        -------
+        timestamp : float
+            Time at which the scan was requested, in seconds since the epoch.
+        values : list of float
+            Values in engineering units, in the same order as `channels`.
+        """
+        timestamp, counts, ai_ranges = await self.measure_raw(channels)
+
+        return timestamp, adc_to_eng(counts, ai_ranges, self.data_format).tolist()
+
+    async def measure_raw(self, channels=None):
+        """Get raw ADC counts for several channels in a single scan.
+
+        Parameters
+        ----------
+        channels : list of int, optional
+            Channels to measure, 0-indexed. If `None`, all channels are measured.
+
+        Returns
+        -------
+        timestamp : float
+            Time at which the scan was requested, in seconds since the epoch.
+        counts : numpy.ndarray of int16
+            ADC counts, in the same order as `channels`, see `xet7019z.measure_raw`.
+        ai_ranges : numpy.ndarray of int
+            AI range setting integers in effect for `counts`, taken from the range
+            cache.
+        """
+        if channels is None:
+            channels = range(self.ai_channels)
+
+        first = min(channels)
+        count = max(channels) - first + 1
+
+        timestamp = time.time()
+        values = await self.instr.read_input_registers(
+            REGISTER_MAP["ai"].address + first, count
+        )
+
+        counts = np.array([values[ch - first] for ch in channels], dtype=np.uint16)
+        ai_ranges = np.array([await self._cached_ai_range(ch) for ch in channels])
+
+        return timestamp, counts.view(np.int16), ai_ranges
+
+    async def enable_cjc(self, enable):
+        """Enable or disable cold junction compensation.
+
+        Parameters
+        ----------
+        enable : bool
+            Enable (`True`) or disable (`False`) cold junction compensation.
+        """
+        await self.instr.write_single_coil(REGISTER_MAP["cjc"].address, enable)
+
+    async def set_cjc_offset(self, channel, offset):
+        """Set the cold junction compensation offset for a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to set, 0-indexed.
+        offset : int
+            Cold junction compensation offset in ADC counts (-9999 to 9999).
+        """
+        if (offset > 9999) or (offset < -9999):
+            raise ValueError(f"Invalid offset: {offset}. Must be >= -9999 and =< 9999.")
+
+        # re-scale from 0 to 65535 using two's complement
+        if offset < 0:
+            offset += 1 << 16
+
+        await self.instr.write_single_register(
+            REGISTER_MAP["cjc_offsets"].address + channel, offset
+        )
+
+    async def get_cjc_offset(self, channel):
+        """Get the cold junction compensation offset for a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to get, 0-indexed.
+
+        Returns
+        -------
+        offset : int
+            Cold junction compensation offset in ADC counts (-9999 to 9999).
+        """
+        offset = (
+            await self.instr.read_holding_registers(
+                REGISTER_MAP["cjc_offsets"].address + channel, 1
+            )
+        )[0]
+
+        return _twos_complement(offset)
+
+    async def enable_ai(self, channel, enable):
+        """Enable or disable an analog input.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to set, 0-indexed.
+        enable : bool
+            Enable (`True`) or disable (`False`) the analog input.
+        """
+        await self.instr.write_single_coil(
+            REGISTER_MAP["ai_enabled"].address + channel, enable
+        )
+
+    async def set_ai_noise_filter(self, plf):
+        """Set analog input noise filter frequency.
+
+        Parameters
+        ----------
+        plf : int, {50, 60}
+            Power line frequency in Hz. Must be 50 or 60.
+        """
+        if plf == 50:
+            cmd = True
+        elif plf == 60:
+            cmd = False
+        else:
+            raise ValueError(f"Invalid power line frequency: {plf}. Must be 50 or 60.")
+
+        await self.instr.write_single_coil(REGISTER_MAP["plf"].address, cmd)
+
+    async def set_ai_data_format(self, data_format):
+        """Set analog input data format.
+
+        Parameters
+        ---------
+        data_format : str
+            Hexadecimal ("hex") or engineering unit ("eng") format.
+        """
+        if data_format == "hex":
+            cmd = False
+        elif data_format == "eng":
+            cmd = True
+        else:
+            raise ValueError(
+                f"Invalid AI data format: {data_format}. Must be 'hex' or 'eng'."
+            )
+
+        await self.instr.write_single_coil(REGISTER_MAP["data_format"].address, cmd)
+        self.data_format = data_format
+
+    async def get_config(self):
+        """Get the complete I/O configuration of the instrument.
+
+        The planned reads are made concurrently, see `read_fields`.
+
+        Returns
+        -------
+        config : dict
+            Configuration snapshot, see `xet7019z.get_config`.
+        """
+        return self._config_snapshot(await self.read_fields(CONFIG_FIELDS))
+
+    async def restore_config(self, config):
+        """Restore a configuration snapshot.
+
+        Parameters
+        ----------
+        config : dict
+            Configuration snapshot, see `xet7019z.restore_config`.
+        """
+        config = dict(config)
+        config.pop("id", None)
+
+        await self.apply_config(**config)
+
+    async def apply_config(
+        self,
+        ranges=None,
+        enabled=None,
+        cjc_offsets=None,
+        plf=None,
+        cjc=None,
+        data_format=None,
+    ):
+        """Apply a channel configuration, writing only the settings that differ.
+
+        The same requests as `xet7019z.apply_config` are made, with the reads, and
+        then the writes, each made concurrently.
+
+        Parameters
+        ----------
+        ranges, enabled, cjc_offsets, plf, cjc, data_format
+            See `xet7019z.apply_config`.
+        """
+        request = self._config_request(
+            ranges, enabled, cjc_offsets, plf, cjc, data_format
+        )
+        current = await self.read_fields(list(request))
+        writes, ai_ranges = self._plan_config(request, current)
+
+        await asyncio.gather(
+            *[
+                getattr(self.instr, name)(address, value)
+                for name, address, value in writes
+            ]
+        )
+
+        if ai_ranges is not None:
+            self._fill_ai_range_cache(ai_ranges)
+
+        if data_format is not None:
+            self.data_format = data_format
+
+    async def enable_calibration(self, enable):
+        """Enable/disable AI calibration mode.
+
+        Parameters
+        ----------
+        enable : bool
+            Enable (`True`) or disable (`False`) AI calibration mode.
+        """
+        await self.instr.write_single_coil(REGISTER_MAP["calibration"].address, enable)
+
+    async def zero_calibration(self):
+        """Record the 0 V or 0 mA calibration value."""
+        await self.instr.write_single_coil(
+            REGISTER_MAP["calibration_trigger"].address, True
+        )
+
+    async def span_calibration(self):
+        """Record the span (positive full range) calibration value."""
+        await self.instr.write_single_coil(
+            REGISTER_MAP["calibration_trigger"].address, True
+        )
@@ -0,0 +1,262 @@
+"""Concurrent polling of many PET-7019Z/ET-7019Z instruments."""
+
+import collections
+import concurrent.futures
+import math
+import time
+
+from .xet7019z import xet7019z
+
+# fleet scan on a shared timeline: the time the fleet scan started, the offset of
+# each instrument scan from it in seconds (`None` if missing) and the values of all
+# configured channels keyed by (host, channel), NaN if missing
+FleetScan = collections.namedtuple("FleetScan", ["timestamp", "offsets", "values"])
+
+
+class _Device:
+    """State of one instrument in a fleet."""
+
+    def __init__(self, host, config):
+        """Construct object.
+
+        Parameters
+        ----------
+        host : str
+            Instrument host.
+        config : dict
+            Instrument configuration. See `Fleet`.
+        """
+        self.host = host
+        self.config = config
+        self.daq = xet7019z()
+        self.channels = sorted(config.get("channels", {}))
+        self.future = None
+
+        self.status = "disconnected"
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.last_success = None
+
+    def record_success(self):
+        """Update health after a successful operation."""
+        self.status = "ok"
+        self.last_error = None
+        self.consecutive_failures = 0
+        self.last_success = time.time()
+
+    def record_failure(self, status, error=None):
+        """Update health after a failed operation.
+
+        Parameters
+        ----------
+        status : str
+            New device status.
+        error : str, optional
+            Description of the failure.
+        """
+        self.status = status
+        self.last_error = error
+        self.consecutive_failures += 1
+
+
+class Fleet:
+    """Pool of instruments that are scanned concurrently.
+
+    Each instrument is driven from a worker thread, so the time taken by a fleet scan
+    is close to that of the slowest instrument rather than the sum over all of them.
+    An instrument that is still busy with a previous operation, e.g. because it has
+    stopped responding, is skipped instead of stalling the others.
+    """
+
+    def __enter__(self):
+        """Enter the runtime context related to this object."""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context related to this object.
+
+        Make sure everything gets cleaned up properly.
+        """
+        self.disconnect()
+
+    def __init__(self, devices, max_workers=None):
+        """Construct object.
+
+        Parameters
+        ----------
+        devices : dict
+            Instrument configurations keyed by host. Each configuration is a dict
+            with the same layout as the `daq` section of the MQTT example config,
+            i.e. optional "port", "timeout" and "plf" keys plus a "channels" dict
+            mapping the channels to measure to their AI range settings.
+        max_workers : int, optional
+            Number of worker threads. Defaults to one per instrument.
+        """
+        if len(devices) == 0:
+            raise ValueError("Invalid devices: no instruments given.")
+
+        for host, config in devices.items():
+            if len(config.get("channels", {})) == 0:
+                raise ValueError(f"Invalid config for {host}: no channels given.")
+
+        self._devices = {
+            host: _Device(host, config) for host, config in devices.items()
+        }
+        self._pool = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or len(self._devices)
+        )
+
+    @property
+    def hosts(self):
+        """Instrument hosts."""
+        return list(self._devices)
+
+    def _run(self, fn, timeout, busy_status):
+        """Run a function for every idle instrument concurrently.
+
+        Parameters
+        ----------
+        fn : callable
+            Function taking a `_Device` as its only argument.
+        timeout : float or None
+            Maximum time to wait for the instruments in seconds.
+        busy_status : str
+            Status recorded for instruments that have not finished in time.
+
+        Returns
+        -------
+        results : dict
+            Return value of `fn` keyed by host, or `None` for instruments that were
+            busy, failed or did not finish in time.
+        """
+        submitted = []
+        for device in self._devices.values():
+            if (device.future is not None) and not device.future.done():
+                device.record_failure("busy", "Previous operation still running.")
+            else:
+                device.future = self._pool.submit(fn, device)
+                submitted.append(device)
+
+        concurrent.futures.wait([device.future for device in submitted], timeout)
+
+        results = {host: None for host in self._devices}
+        for device in submitted:
+            if not device.future.done():
+                device.record_failure(busy_status, "Timed out.")
+                continue
+
+            try:
+                results[device.host] = device.future.result()
+            except Exception as e:
+                device.record_failure("error", repr(e))
+            else:
+                device.record_success()
+
+        return results
+
+    def connect(self, reset=True, timeout=None):
+        """Connect to and set up all instruments.
+
+        Parameters
+        ----------
+        reset : bool, optional
+            Reset the instruments to the built-in default configuration.
+        timeout : float, optional
+            Maximum time to wait for the instruments in seconds.
+
+        Returns
+        -------
+        connected : dict
+            `True` for each host that was connected and set up, keyed by host.
+        """
+
+        def setup(device):
+            daq = device.daq
+            config = device.config
+            daq.connect(
+                device.host, config.get("port", 502), config.get("timeout"), reset
+            )
+
+            # enable only the analog inputs in use and apply their ranges and the
+            # global settings
+            channels = config.get("channels", {})
+            daq.apply_config(
+                ranges=channels,
+                enabled={
+                    channel: channel in channels for channel in range(daq.ai_channels)
+                },
+                plf=config.get("plf"),
+                cjc=True,
+            )
+
+            return True
+
+        results = self._run(setup, timeout, "timeout")
+
+        return {host: result is True for host, result in results.items()}
+
+    def disconnect(self):
+        """Disconnect all instruments and stop the worker threads."""
+        for device in self._devices.values():
+            device.daq.disconnect()
+            device.status = "disconnected"
+        self._pool.shutdown(wait=False)
+
+    def scan(self, timeout=None):
+        """Measure the configured channels of all instruments concurrently.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait for the instruments in seconds. Instruments that have
+            not responded in time are reported as missing from this scan and skipped
+            by later scans until they respond.
+
+        Returns
+        -------
+        scan : FleetScan
+            Scans of all instruments merged into one record on the fleet timeline.
+            "values" has the same keys in every scan, in host then channel order,
+            with NaN for the channels of instruments that did not return a scan.
+        """
+        timestamp = time.time()
+
+        def measure(device):
+            return device.daq.measure_all(device.channels)
+
+        results = self._run(measure, timeout, "timeout")
+
+        offsets = {}
+        values = {}
+        for host, device in self._devices.items():
+            if results[host] is None:
+                offsets[host] = None
+                scan_values = [math.nan] * len(device.channels)
+            else:
+                offsets[host] = results[host][0] - timestamp
+                scan_values = results[host][1]
+
+            for channel, value in zip(device.channels, scan_values):
+                values[(host, channel)] = value
+
+        return FleetScan(timestamp, offsets, values)
+
+    def health(self):
+        """Get the health status of all instruments.
+
+        Returns
+        -------
+        health : dict
+            Health keyed by host. Each value is a dict with the "status" ("ok",
+            "error", "timeout", "busy" or "disconnected"), "last_error",
+            "consecutive_failures" and "last_success" time of the instrument.
+        """
+        return {
+            host: {
+                "status": device.status,
+                "last_error": device.last_error,
+                "consecutive_failures": device.consecutive_failures,
+                "last_success": device.last_success,
+            }
+            for host, device in self._devices.items()
+        }
@@ -0,0 +1,307 @@
+"""Opt-in Modbus transaction and method latency metrics for instrument objects.
+
+Metrics are collected by wrapping the Modbus client and the public methods of an
+instrument object, so there is no overhead while they are disabled.
+"""
+
+import bisect
+import socket
+import threading
+
+from pyModbusTCP.constants import MB_TIMEOUT_ERR
+
+from .proxy import FUNCTION_CODES, ClientProxy, unwrap_methods, wrap_methods
+
+# upper bounds of the latency histogram buckets in seconds
+LATENCY_BUCKETS = (
+    1e-4,
+    2e-4,
+    5e-4,
+    1e-3,
+    2e-3,
+    5e-3,
+    1e-2,
+    2e-2,
+    5e-2,
+    0.1,
+    0.2,
+    0.5,
+    1,
+    2,
+    5,
+    10,
+    30,
+)
+
+# bytes in a Modbus TCP frame excluding the PDU data: MBAP header, function code,
+# address and count
+_MBAP_SIZE = 7
+
+
+def frame_sizes(function_code, value, result):
+    """Calculate the sizes of the Modbus TCP request and response frames.
+
+    Parameters
+    ----------
+    function_code : int
+        Modbus function code.
+    value : int, bool or list
+        Number of items read, or value(s) written.
+    result : list, bool or None
+        Result returned by the client. `None` if the request failed.
+
+    Returns
+    -------
+    sent : int
+        Request frame size in bytes.
+    received : int
+        Response frame size in bytes, 0 if no valid response was received.
+    """
+    if function_code in (1, 2):
+        sent = _MBAP_SIZE + 5
+        received = _MBAP_SIZE + 2 + (value + 7) // 8
+    elif function_code in (3, 4):
+        sent = _MBAP_SIZE + 5
+        received = _MBAP_SIZE + 2 + 2 * value
+    elif function_code == 15:
+        sent = _MBAP_SIZE + 6 + (len(value) + 7) // 8
+        received = _MBAP_SIZE + 5
+    elif function_code == 16:
+        sent = _MBAP_SIZE + 6 + 2 * len(value)
+        received = _MBAP_SIZE + 5
+    else:
+        sent = _MBAP_SIZE + 5
+        received = _MBAP_SIZE + 5
+
+    if result is None:
+        received = 0
+
+    return sent, received
+
+
+class LatencyHistogram:
+    """Histogram of latencies with fixed bucket bounds."""
+
+    def __init__(self):
+        """Construct object."""
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        """Record a latency.
+
+        Parameters
+        ----------
+        seconds : float
+            Latency in seconds.
+        """
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def snapshot(self):
+        """Get the histogram contents.
+
+        Returns
+        -------
+        snapshot : dict
+            "count", "total", "mean" and "max" latency in seconds, and "buckets",
+            a list of `(upper bound, count)` tuples. The last bound is `inf`.
+        """
+        bounds = LATENCY_BUCKETS + (float("inf"),)
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "buckets": list(zip(bounds, self.buckets)),
+        }
+
+
+class Metrics:
+    """Modbus transaction and method latency metrics of an instrument object."""
+
+    def __init__(self):
+        """Construct object."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Clear all metrics."""
+        with self._lock:
+            # transaction counts keyed by function code and by (function code,
+            # start address)
+            self.function_codes = {}
+            self.registers = {}
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.errors = 0
+            self.timeouts = 0
+            self.transaction_latency = {}
+            self.method_latency = {}
+
+    def record_transaction(
+        self, function_code, address, sent, received, seconds, error, timeout
+    ):
+        """Record a Modbus transaction.
+
+        Parameters
+        ----------
+        function_code : int
+            Modbus function code.
+        address : int
+            Start address.
+        sent : int
+            Request size in bytes.
+        received : int
+            Response size in bytes.
+        seconds : float
+            Transaction latency in seconds.
+        error : bool
+            The transaction failed.
+        timeout : bool
+            The transaction failed because it timed out.
+        """
+        key = (function_code, address)
+        with self._lock:
+            self.function_codes[function_code] = (
+                self.function_codes.get(function_code, 0) + 1
+            )
+            self.registers[key] = self.registers.get(key, 0) + 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.errors += error
+            self.timeouts += timeout
+            try:
+                histogram = self.transaction_latency[function_code]
+            except KeyError:
+                histogram = self.transaction_latency[function_code] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def record_call(self, name, seconds):
+        """Record a call of an instrument method.
+
+        Parameters
+        ----------
+        name : str
+            Method name.
+        seconds : float
+            Call latency in seconds.
+        """
+        with self._lock:
+            try:
+                histogram = self.method_latency[name]
+            except KeyError:
+                histogram = self.method_latency[name] = LatencyHistogram()
+            histogram.record(seconds)
+
+    def snapshot(self):
+        """Get a snapshot of all metrics.
+
+        Returns
+        -------
+        snapshot : dict
+            "transactions" (total count), "function_codes" (count keyed by function
+            code), "registers" (count keyed by function code then start address),
+            "bytes_sent", "bytes_received", "errors", "timeouts", and latency
+            histograms keyed by function code ("transaction_latency") and by method
+            name ("method_latency"). See `LatencyHistogram.snapshot`.
+        """
+        with self._lock:
+            registers = {}
+            for (function_code, address), count in self.registers.items():
+                registers.setdefault(function_code, {})[address] = count
+
+            return {
+                "transactions": sum(self.function_codes.values()),
+                "function_codes": dict(self.function_codes),
+                "registers": registers,
+                "bytes_sent": self.bytes_sent,
+                "bytes_received": self.bytes_received,
+                "errors": self.errors,
+                "timeouts": self.timeouts,
+                "transaction_latency": {
+                    function_code: histogram.snapshot()
+                    for function_code, histogram in self.transaction_latency.items()
+                },
+                "method_latency": {
+                    name: histogram.snapshot()
+                    for name, histogram in self.method_latency.items()
+                },
+            }
+
+
+class InstrumentedClient(ClientProxy):
+    """Modbus client proxy that records every request in a `Metrics` object.
+
+    Attributes other than the request methods are passed through to the wrapped
+    client.
+    """
+
+    def __init__(self, client, metrics):
+        """Construct object.
+
+        Parameters
+        ----------
+        client : pyModbusTCP.client.ModbusClient
+            Modbus client to wrap.
+        metrics : Metrics
+            Metrics to record requests in.
+        """
+        object.__setattr__(self, "metrics", metrics)
+        super().__init__(client)
+
+    def _record(self, name, function_code, address, value, result, error, start, end):
+        """Record a request as a transaction, see `ClientProxy._record`."""
+        if error is not None:
+            sent, _ = frame_sizes(function_code, value, None)
+            received = 0
+            timeout = isinstance(error, (socket.timeout, TimeoutError))
+        else:
+            sent, received = frame_sizes(function_code, value, result)
+            timeout = (result is None) and (
+                getattr(self.client, "last_error", None) == MB_TIMEOUT_ERR
+            )
+        failed = (error is not None) or (result is None)
+
+        self.metrics.record_transaction(
+            function_code, address, sent, received, end - start, failed, timeout
+        )
+
+
+def instrument(daq, metrics, exclude=()):
+    """Start recording the transactions and method calls of an instrument object.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Instrument object.
+    metrics : Metrics
+        Metrics to record in.
+    exclude : tuple of str
+        Public methods not to time.
+    """
+    daq.instr = InstrumentedClient(daq.instr, metrics)
+
+    def record(name, args, start, end):
+        metrics.record_call(name, end - start)
+
+    wrap_methods(daq, record, exclude, metrics=metrics)
+
+
+def uninstrument(daq):
+    """Stop recording the transactions and method calls of an instrument object.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Instrument object previously passed to `instrument`.
+    """
+    if isinstance(daq.instr, InstrumentedClient):
+        daq.instr = daq.instr.client
+
+    unwrap_methods(daq, lambda attr: hasattr(attr, "metrics"))
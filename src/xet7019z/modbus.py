@@ -0,0 +1,240 @@
+"""Minimal Modbus TCP framing for the function codes used by the ET-7019Z."""
+
+import struct
+
+READ_COILS = 1
+READ_DISCRETE_INPUTS = 2
+READ_HOLDING_REGISTERS = 3
+READ_INPUT_REGISTERS = 4
+WRITE_SINGLE_COIL = 5
+WRITE_SINGLE_REGISTER = 6
+WRITE_MULTIPLE_COILS = 15
+WRITE_MULTIPLE_REGISTERS = 16
+
+READ_BITS = (READ_COILS, READ_DISCRETE_INPUTS)
+READ_REGISTERS = (READ_HOLDING_REGISTERS, READ_INPUT_REGISTERS)
+
+# maximum size of a Modbus TCP frame
+MAX_FRAME = 260
+
+# transaction id, protocol id, length, unit id
+MBAP_HEADER = struct.Struct(">HHHB")
+
+# function code, address and count or value of a request
+REQUEST = struct.Struct(">BHH")
+
+# function code and byte count of a read response
+READ_RESPONSE = struct.Struct(">BB")
+
+
+class ModbusError(Exception):
+    """Modbus exception response or malformed frame."""
+
+
+def _pack_bits(bits):
+    """Pack a sequence of booleans into bytes, least significant bit first.
+
+    Parameters
+    ----------
+    bits : list of bool
+        Coil values.
+
+    Returns
+    -------
+    packed : bytes
+        Packed coil values.
+    """
+    packed = bytearray((len(bits) + 7) // 8)
+    for i, bit in enumerate(bits):
+        if bit:
+            packed[i // 8] |= 1 << (i % 8)
+
+    return bytes(packed)
+
+
+def build_pdu(function_code, address, value):
+    """Build a request protocol data unit.
+
+    Parameters
+    ----------
+    function_code : int
+        Modbus function code.
+    address : int
+        Start address.
+    value : int, bool or list
+        Number of items to read for read requests, the value to write for single
+        write requests, or the list of values to write for multiple write requests.
+
+    Returns
+    -------
+    pdu : bytes
+        Request PDU.
+    """
+    if function_code in READ_BITS + READ_REGISTERS:
+        return REQUEST.pack(function_code, address, value)
+    elif function_code == WRITE_SINGLE_COIL:
+        return REQUEST.pack(function_code, address, 0xFF00 if value else 0)
+    elif function_code == WRITE_SINGLE_REGISTER:
+        return REQUEST.pack(function_code, address, value)
+    elif function_code == WRITE_MULTIPLE_COILS:
+        packed = _pack_bits(value)
+        return (
+            struct.pack(">BHHB", function_code, address, len(value), len(packed))
+            + packed
+        )
+    elif function_code == WRITE_MULTIPLE_REGISTERS:
+        return struct.pack(
+            f">BHHB{len(value)}H",
+            function_code,
+            address,
+            len(value),
+            2 * len(value),
+            *value,
+        )
+    else:
+        raise ValueError(f"Unsupported function code: {function_code}.")
+
+
+def build_request(transaction_id, unit_id, function_code, address, value):
+    """Build a Modbus TCP request frame.
+
+    Parameters
+    ----------
+    transaction_id : int
+        MBAP transaction identifier (0 to 65535).
+    unit_id : int
+        MBAP unit identifier.
+    function_code : int
+        Modbus function code.
+    address : int
+        Start address.
+    value : int, bool or list
+        See `build_pdu`.
+
+    Returns
+    -------
+    frame : bytes
+        Request frame.
+    """
+    pdu = build_pdu(function_code, address, value)
+
+    return MBAP_HEADER.pack(transaction_id, 0, len(pdu) + 1, unit_id) + pdu
+
+
+def data_bytes(function_code, count):
+    """Calculate the number of data bytes in the response to a read request.
+
+    Parameters
+    ----------
+    function_code : int
+        Function code of the read request.
+    count : int
+        Number of coils or registers requested.
+
+    Returns
+    -------
+    n_bytes : int
+        Number of data bytes.
+    """
+    if function_code in READ_BITS:
+        return (count + 7) // 8
+
+    return 2 * count
+
+
+def check_header(protocol_id, length):
+    """Check the MBAP header of a response.
+
+    Parameters
+    ----------
+    protocol_id : int
+        MBAP protocol identifier.
+    length : int
+        MBAP length, i.e. the number of bytes following it in the frame.
+
+    Raises
+    ------
+    ModbusError
+        If the header isn't a Modbus TCP header or the length can't be that of a
+        response.
+    """
+    # the shortest response is an exception response of unit id, function code and
+    # exception code
+    if (protocol_id != 0) or not (3 <= length <= MAX_FRAME - MBAP_HEADER.size + 1):
+        raise ModbusError("Malformed MBAP header in response.")
+
+
+def check_response(function_code, pdu, count=None):
+    """Check a response protocol data unit answers a request.
+
+    Parameters
+    ----------
+    function_code : int
+        Function code of the request.
+    pdu : bytes-like
+        Response PDU.
+    count : int, optional
+        Number of coils or registers requested by a read request. If given, the
+        number of data bytes in the response is checked against it.
+
+    Raises
+    ------
+    ModbusError
+        If the response is an exception response, is for a different function code,
+        or doesn't have the data requested.
+    """
+    if pdu[0] == function_code | 0x80:
+        raise ModbusError(f"Modbus exception code {pdu[1]} (function {function_code}).")
+    elif pdu[0] != function_code:
+        raise ModbusError(
+            f"Unexpected function code in response: {pdu[0]}. Expected "
+            + f"{function_code}."
+        )
+
+    if function_code in READ_BITS + READ_REGISTERS:
+        if len(pdu) < READ_RESPONSE.size:
+            raise ModbusError("Read response has no byte count.")
+
+        byte_count = pdu[1]
+        if (count is not None) and (byte_count != data_bytes(function_code, count)):
+            raise ModbusError(
+                f"Expected {data_bytes(function_code, count)} data bytes, got "
+                + f"{byte_count}."
+            )
+        elif len(pdu) != READ_RESPONSE.size + byte_count:
+            raise ModbusError(
+                f"Read response of {len(pdu)} bytes doesn't match its byte count "
+                + f"{byte_count}."
+            )
+
+
+def parse_pdu(function_code, pdu, count=None):
+    """Parse a response protocol data unit.
+
+    Parameters
+    ----------
+    function_code : int
+        Function code of the request.
+    pdu : bytes
+        Response PDU.
+    count : int, optional
+        Number of coils or registers requested by a read request, used to check the
+        response and trim the padding of bit responses.
+
+    Returns
+    -------
+    result : list of bool, list of int or bool
+        Coil values for bit reads, register values for register reads, or `True`
+        for writes.
+    """
+    check_response(function_code, pdu, count)
+
+    if function_code in READ_BITS:
+        n_bytes = pdu[1]
+        bits = [bool(pdu[2 + i // 8] & (1 << (i % 8))) for i in range(8 * n_bytes)]
+        return bits[:count] if count is not None else bits
+    elif function_code in READ_REGISTERS:
+        n_bytes = pdu[1]
+        return list(struct.unpack_from(f">{n_bytes // 2}H", pdu, 2))
+    else:
+        return True
@@ -0,0 +1,241 @@
+"""Wrappers that observe Modbus requests and instrument method calls.
+
+These are the common base of the opt-in metrics (`metrics`) and tracing (`tracing`)
+of instrument objects.
+"""
+
+import time
+
+# Modbus function code of each client request method
+FUNCTION_CODES = {
+    "read_coils": 1,
+    "read_discrete_inputs": 2,
+    "read_holding_registers": 3,
+    "read_input_registers": 4,
+    "write_single_coil": 5,
+    "write_single_register": 6,
+    "write_multiple_coils": 15,
+    "write_multiple_registers": 16,
+}
+
+
+class ClientProxy:
+    """Modbus client proxy that observes every request.
+
+    Each request method of the wrapped client is replaced with a wrapper that passes
+    the request, its outcome and its start and end times to `_record`, which
+    subclasses implement. So are the `pipeline` and `read_input_registers_view`
+    methods of clients that have them, e.g. `transport.ModbusTransport`, so wrapping
+    a client doesn't hide them. Attributes other than the request methods are
+    passed through to the wrapped client.
+    """
+
+    def __init__(self, client):
+        """Construct object.
+
+        Parameters
+        ----------
+        client : pyModbusTCP.client.ModbusClient
+            Modbus client to wrap.
+        """
+        object.__setattr__(self, "client", client)
+
+        for name, function_code in FUNCTION_CODES.items():
+            if hasattr(client, name):
+                object.__setattr__(
+                    self, name, self._wrap(getattr(client, name), name, function_code)
+                )
+
+        if hasattr(client, "read_input_registers_view"):
+            object.__setattr__(
+                self,
+                "read_input_registers_view",
+                self._wrap(
+                    client.read_input_registers_view,
+                    "read_input_registers",
+                    FUNCTION_CODES["read_input_registers"],
+                ),
+            )
+        if hasattr(client, "pipeline"):
+            object.__setattr__(self, "pipeline", self._wrap_pipeline(client.pipeline))
+
+    def __getattr__(self, name):
+        """Get an attribute of the wrapped client."""
+        return getattr(self.client, name)
+
+    def __setattr__(self, name, value):
+        """Set an attribute of the wrapped client."""
+        setattr(self.client, name, value)
+
+    def _wrap(self, request, name, function_code):
+        """Wrap a request method to record its transactions.
+
+        Parameters
+        ----------
+        request : callable
+            Request method of the client.
+        name : str
+            Request method name.
+        function_code : int
+            Modbus function code of the request.
+
+        Returns
+        -------
+        wrapper : callable
+            Wrapped request method.
+        """
+        record = self._record
+
+        def wrapper(address, value=1):
+            result = error = None
+            start = time.perf_counter()
+            try:
+                result = request(address, value)
+                return result
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                end = time.perf_counter()
+                record(name, function_code, address, value, result, error, start, end)
+
+        return wrapper
+
+    def _wrap_pipeline(self, pipeline):
+        """Wrap a pipeline method to record each of its requests.
+
+        The requests are in flight together, so each is recorded with the start and
+        end times of the whole pipeline.
+
+        Parameters
+        ----------
+        pipeline : callable
+            Pipeline method of the client, see `transport.ModbusTransport.pipeline`.
+
+        Returns
+        -------
+        wrapper : callable
+            Wrapped pipeline method.
+        """
+        record = self._record
+
+        def wrapper(requests):
+            results = error = None
+            start = time.perf_counter()
+            try:
+                results = pipeline(requests)
+                return results
+            except Exception as e:
+                error = e
+                raise
+            finally:
+                end = time.perf_counter()
+                for i, (name, address, value) in enumerate(requests):
+                    result = None if results is None else results[i]
+                    function_code = FUNCTION_CODES.get(name)
+                    record(
+                        name, function_code, address, value, result, error, start, end
+                    )
+
+        return wrapper
+
+    def _record(self, name, function_code, address, value, result, error, start, end):
+        """Record a request.
+
+        Parameters
+        ----------
+        name : str
+            Request method name.
+        function_code : int
+            Modbus function code of the request.
+        address : int
+            Start address.
+        value : int, bool or list
+            Number of items read, or value(s) written.
+        result : list, bool or None
+            Result returned by the client, `None` if the request failed.
+        error : Exception or None
+            Exception raised by the client, if any.
+        start, end : float
+            Start and end times from `time.perf_counter` in seconds.
+        """
+        raise NotImplementedError
+
+
+def wrap_method(daq, name, record, **attributes):
+    """Wrap an instrument method to record its calls.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Instrument object.
+    name : str
+        Method name.
+    record : callable
+        Function called with the method name, the positional arguments of the call
+        and its start and end times from `time.perf_counter` in seconds.
+    **attributes
+        Attributes set on the wrapper that identify what wrapped it, see
+        `unwrap_methods`.
+
+    Returns
+    -------
+    wrapper : callable
+        Wrapped method.
+    """
+    method = getattr(daq, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record(name, args, start, time.perf_counter())
+
+    wrapper.__name__ = name
+    wrapper.__doc__ = method.__doc__
+    for attribute, value in attributes.items():
+        setattr(wrapper, attribute, value)
+
+    # method wrapped by an earlier instrumentation of the instance, if any
+    wrapper.wrapped = vars(daq).get(name)
+
+    return wrapper
+
+
+def wrap_methods(daq, record, exclude=(), **attributes):
+    """Wrap all public methods of an instrument object to record their calls.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Instrument object.
+    record : callable
+        See `wrap_method`.
+    exclude : tuple of str
+        Public methods not to wrap.
+    **attributes
+        See `wrap_method`.
+    """
+    for name, attr in vars(type(daq)).items():
+        if callable(attr) and not name.startswith("_") and name not in exclude:
+            setattr(daq, name, wrap_method(daq, name, record, **attributes))
+
+
+def unwrap_methods(daq, match):
+    """Restore the methods of an instrument object wrapped by `wrap_method`.
+
+    Parameters
+    ----------
+    daq : xet7019z
+        Instrument object.
+    match : callable
+        Function that takes a method wrapper and returns `True` if it should be
+        removed, e.g. by checking the attributes passed to `wrap_method`.
+    """
+    for name, attr in list(vars(daq).items()):
+        if hasattr(attr, "wrapped") and match(attr):
+            if attr.wrapped is None:
+                delattr(daq, name)
+            else:
+                setattr(daq, name, attr.wrapped)
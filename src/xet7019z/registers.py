@@ -0,0 +1,222 @@
+"""Declarative register map of the ET-7019Z and a planner for coalesced reads.
+
+Each field of the map names a block of coils, discrete inputs, holding registers or
+input registers together with a codec that decodes the raw values. `plan_reads`
+turns any set of fields into the fewest Modbus read requests, merging adjoining
+fields of the same table into one request as long as it stays within the
+per-request limits of the protocol. `read_fields` makes the requests and
+`decode_fields` decodes the fields from their results.
+"""
+
+import collections
+
+import numpy as np
+
+Field = collections.namedtuple("Field", ["table", "address", "count", "codec"])
+Field.__doc__ = """Block of coils, discrete inputs or registers.
+
+Attributes
+----------
+table : str, {"coil", "discrete", "holding", "input"}
+    Modbus table of the block.
+address : int
+    Address of the first item.
+count : int
+    Number of items.
+codec : str
+    Name of the codec in `CODECS` that decodes the raw values.
+"""
+
+ReadRequest = collections.namedtuple("ReadRequest", ["method", "address", "count"])
+ReadRequest.__doc__ = """Modbus read request.
+
+Attributes
+----------
+method : str
+    Name of the client request method.
+address : int
+    Address of the first item.
+count : int
+    Number of items.
+"""
+
+# client request method and maximum number of items per request of each table
+READ_METHODS = {
+    "coil": "read_coils",
+    "discrete": "read_discrete_inputs",
+    "holding": "read_holding_registers",
+    "input": "read_input_registers",
+}
+READ_LIMITS = {"coil": 2000, "discrete": 2000, "holding": 125, "input": 125}
+
+# maximum number of unwanted items read between merged fields by default. The
+# instrument answers reads that cover addresses it doesn't implement, e.g. holding
+# registers 437 to 490, with an exception response, so only adjoining fields are
+# merged. That's intentional even where it costs a request, e.g. the identity takes
+# three because input register 352, between the firmware and I/O versions, isn't in
+# the published register table.
+MAX_GAP = 0
+
+
+def _format_version(value):
+    """Format a version register as a version string.
+
+    Parameters
+    ----------
+    value : int
+        Version register value, one hex digit per version component.
+
+    Returns
+    -------
+    version : str
+        Version string, e.g. '1.0.2' for 0x102.
+    """
+    return ".".join(hex(value)[2:])
+
+
+# functions decoding a list of raw values of a field
+CODECS = {
+    "uint16": lambda values: [int(value) for value in values],
+    "int16": lambda values: np.array(values, dtype=np.uint16).view(np.int16).tolist(),
+    "bool": lambda values: [bool(value) for value in values],
+    "hex": lambda values: [hex(value)[2:] for value in values],
+    "version": lambda values: [_format_version(value) for value in values],
+    "plf": lambda values: [50 if value else 60 for value in values],
+    "data_format": lambda values: ["eng" if value else "hex" for value in values],
+}
+
+REGISTER_MAP = {
+    "ai": Field("input", 0, 10, "int16"),
+    "os_version": Field("input", 350, 1, "version"),
+    "fw_version": Field("input", 351, 1, "version"),
+    "io_version": Field("input", 353, 1, "version"),
+    "reset": Field("coil", 226, 1, "bool"),
+    "ai_ranges": Field("holding", 427, 10, "uint16"),
+    "cjc_offsets": Field("holding", 491, 10, "int16"),
+    "model": Field("holding", 559, 1, "hex"),
+    "ai_enabled": Field("coil", 595, 10, "bool"),
+    "cjc": Field("coil", 627, 1, "bool"),
+    "plf": Field("coil", 629, 1, "plf"),
+    "data_format": Field("coil", 631, 1, "data_format"),
+    "calibration": Field("coil", 830, 1, "bool"),
+    "calibration_trigger": Field("coil", 831, 1, "bool"),
+}
+
+# fields holding the I/O configuration, see `xet7019z.get_config`
+CONFIG_FIELDS = ["ai_ranges", "cjc_offsets", "ai_enabled", "cjc", "plf", "data_format"]
+
+
+def plan_reads(names, register_map=REGISTER_MAP, max_gap=MAX_GAP):
+    """Plan the fewest read requests covering a set of fields.
+
+    Fields of the same table that adjoin, or are at most `max_gap` items apart, are
+    merged into one request while it stays within the per-request limit of the table
+    in `READ_LIMITS`.
+
+    Parameters
+    ----------
+    names : iterable of str
+        Names of the fields to read.
+    register_map : dict
+        Fields keyed by name.
+    max_gap : int, optional
+        Maximum number of unwanted items between merged fields. Only increase it if
+        the instrument implements every address in the gaps, otherwise the merged
+        request fails. If `None`, any gap that fits within the request limit is
+        read.
+
+    Returns
+    -------
+    requests : list of ReadRequest
+        Read requests.
+    """
+    fields = collections.defaultdict(list)
+    for name in dict.fromkeys(names):
+        field = register_map[name]
+        fields[field.table].append(field)
+
+    requests = []
+    for table, table_fields in fields.items():
+        limit = READ_LIMITS[table]
+        start = end = None
+        for field in sorted(table_fields, key=lambda f: f.address):
+            field_end = field.address + field.count
+            if (
+                (start is not None)
+                and (max(end, field_end) - start <= limit)
+                and ((max_gap is None) or (field.address - end <= max_gap))
+            ):
+                end = max(end, field_end)
+            else:
+                if start is not None:
+                    requests.append(
+                        ReadRequest(READ_METHODS[table], start, end - start)
+                    )
+                start, end = field.address, field_end
+        requests.append(ReadRequest(READ_METHODS[table], start, end - start))
+
+    return requests
+
+
+def read_fields(batch, names, register_map=REGISTER_MAP, max_gap=MAX_GAP):
+    """Read and decode a set of fields with the fewest requests.
+
+    Parameters
+    ----------
+    batch : callable
+        Function that makes a list of (client method name, address, count) requests
+        and returns their results, e.g. `xet7019z._batch`.
+    names : iterable of str
+        Names of the fields to read.
+    register_map : dict
+        Fields keyed by name.
+    max_gap : int, optional
+        See `plan_reads`.
+
+    Returns
+    -------
+    values : dict
+        Decoded values keyed by field name. Fields with a count of 1 are decoded to a
+        single value, others to a list.
+    """
+    requests = plan_reads(names, register_map, max_gap)
+
+    return decode_fields(names, requests, batch(requests), register_map)
+
+
+def decode_fields(names, requests, results, register_map=REGISTER_MAP):
+    """Decode a set of fields from the results of planned read requests.
+
+    Parameters
+    ----------
+    names : iterable of str
+        Names of the fields to decode.
+    requests : list of ReadRequest
+        Read requests covering the fields, as returned by `plan_reads`.
+    results : list of list
+        Result of each request.
+    register_map : dict
+        Fields keyed by name.
+
+    Returns
+    -------
+    values : dict
+        Decoded values keyed by field name. Fields with a count of 1 are decoded to a
+        single value, others to a list.
+    """
+    values = {}
+    for name in names:
+        field = register_map[name]
+        method = READ_METHODS[field.table]
+        for request, result in zip(requests, results):
+            offset = field.address - request.address
+            if (
+                (request.method == method)
+                and (offset >= 0)
+                and (offset + field.count <= request.count)
+            ):
+                decoded = CODECS[field.codec](result[offset : offset + field.count])
+                values[name] = decoded[0] if field.count == 1 else decoded
+                break
+
+    return values
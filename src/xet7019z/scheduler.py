@@ -0,0 +1,178 @@
+"""Drift-free fixed-rate scheduling of scans."""
+
+import collections
+import math
+import threading
+import time
+
+ScanRecord = collections.namedtuple("ScanRecord", ["tick", "start", "end", "result"])
+ScanRecord.__doc__ = """Result of a scheduled call.
+
+Attributes
+----------
+tick : int
+    Index of the tick on the schedule timeline.
+start : float
+    Time the call started, in seconds since the epoch.
+end : float
+    Time the call finished, in seconds since the epoch.
+result : object
+    Return value of the call.
+"""
+
+
+class FixedRateScheduler:
+    """Call a function at a fixed rate on an absolute monotonic timeline.
+
+    Tick `k` is due at `t0 + k * period`, where `t0` is when `run` was called, so the
+    rate doesn't drift with the time taken by each call. If a call overruns one or
+    more ticks, those ticks are skipped and counted in `missed` instead of being
+    run late.
+
+    Start and end times are measured with `time.perf_counter` and reported as seconds
+    since the epoch relative to a single wall clock reading, so they are monotonic
+    and unaffected by wall clock adjustments during a run.
+
+    The schedule can also be driven by the caller, e.g. from an event loop that does
+    other work between ticks: call `restart`, then wait `remaining` seconds before
+    each call and pass its times and result to `record`.
+    """
+
+    def __init__(self, period, fn, callback=None):
+        """Construct object.
+
+        Parameters
+        ----------
+        period : float
+            Time between ticks in seconds.
+        fn : callable or None
+            Function to call on each tick, taking no arguments. It's only needed by
+            `run`.
+        callback : callable, optional
+            Function called with a `ScanRecord` after each call of `fn`.
+        """
+        if period <= 0:
+            raise ValueError(f"Invalid period: {period}. Must be > 0.")
+
+        self.period = period
+        self.fn = fn
+        self.callback = callback
+
+        # number of ticks run and skipped
+        self.ticks = 0
+        self.missed = 0
+
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._wall_origin = time.time()
+        self._perf_origin = time.perf_counter()
+
+        # start of the timeline and the next tick due
+        self._t0 = self._perf_origin
+        self._tick = 0
+
+    def _epoch(self, t):
+        """Convert a `time.perf_counter` reading to seconds since the epoch.
+
+        Parameters
+        ----------
+        t : float
+            `time.perf_counter` reading.
+
+        Returns
+        -------
+        epoch : float
+            Seconds since the epoch.
+        """
+        return self._wall_origin + (t - self._perf_origin)
+
+    def restart(self):
+        """Start a new timeline, with the first tick due now."""
+        self._t0 = time.perf_counter()
+        self._tick = 0
+
+    def remaining(self):
+        """Get the time until the next tick is due.
+
+        Returns
+        -------
+        remaining : float
+            Time in seconds, 0 or less if the tick is due.
+        """
+        return self._t0 + self._tick * self.period - time.perf_counter()
+
+    def record(self, start, end, result):
+        """Record a call made for the next tick and advance the schedule.
+
+        Parameters
+        ----------
+        start : float
+            `time.perf_counter` reading when the call started.
+        end : float
+            `time.perf_counter` reading when the call finished.
+        result : object
+            Return value of the call.
+
+        Returns
+        -------
+        record : ScanRecord
+            Record of the call, also passed to `callback`.
+        """
+        record = ScanRecord(self._tick, self._epoch(start), self._epoch(end), result)
+        self.ticks += 1
+
+        if self.callback is not None:
+            self.callback(record)
+
+        # next tick that hasn't already passed
+        tick = max(self._tick + 1, math.floor((end - self._t0) / self.period) + 1)
+        self.missed += tick - self._tick - 1
+        self._tick = tick
+
+        return record
+
+    def run(self, until=None):
+        """Run the schedule in the calling thread until stopped.
+
+        Parameters
+        ----------
+        until : callable, optional
+            Predicate checked before each tick. The schedule stops when it returns
+            `True`.
+        """
+        self._stop.clear()
+        self.restart()
+
+        while not self._stop.is_set():
+            if (until is not None) and until():
+                break
+
+            start = time.perf_counter()
+            result = self.fn()
+            self.record(start, time.perf_counter(), result)
+
+            self._stop.wait(max(0, self.remaining()))
+
+    def start(self, until=None):
+        """Run the schedule on a background thread.
+
+        Parameters
+        ----------
+        until : callable, optional
+            See `run`.
+        """
+        if (self._thread is not None) and self._thread.is_alive():
+            raise RuntimeError("Scheduler is already running.")
+
+        self._thread = threading.Thread(target=self.run, args=(until,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the schedule, interrupting any wait for the next tick."""
+        self._stop.set()
+        if (self._thread is not None) and (
+            self._thread is not threading.current_thread()
+        ):
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,254 @@
+"""Thread-safe shared Modbus client with a priority request scheduler."""
+
+import concurrent.futures
+import contextlib
+import heapq
+import itertools
+import threading
+
+import pyModbusTCP.client
+
+# request priorities, lower runs first
+CONTROL = 0
+POLL = 1
+
+READS = [
+    "read_coils",
+    "read_discrete_inputs",
+    "read_holding_registers",
+    "read_input_registers",
+]
+WRITES = [
+    "write_single_coil",
+    "write_single_register",
+    "write_multiple_coils",
+    "write_multiple_registers",
+]
+
+# client methods not passed through: a view of the receive buffer can be overwritten
+# by a request from another thread before it's used
+UNSHARED = ["read_input_registers_view"]
+
+
+class SharedClient:
+    """Modbus client proxy that lets many threads share one connection.
+
+    Requests from all threads are queued and run one at a time by a dispatcher
+    thread, so transactions on the connection never interleave. Writes, `open` and
+    `close` run at `CONTROL` priority, ahead of reads queued at `POLL` priority, so
+    changing a setting doesn't wait behind background polling. Reads can be raised to
+    `CONTROL` priority with the `control` context manager.
+
+    A read that's identical to one still waiting in the queue is merged with it:
+    both callers get the result of a single transaction, counted in `merged`.
+
+    If the wrapped client can pipeline requests, e.g. `transport.ModbusTransport`,
+    a pipeline runs as one request on the dispatcher thread, at `CONTROL` priority
+    if it writes. Its `read_input_registers_view` isn't available, because the view
+    could be overwritten by a request from another thread before it's used.
+
+    Other attributes are passed through to the wrapped client. The client can be
+    passed to `xet7019z` in place of the default pyModbusTCP client, and that
+    instrument object shared between threads.
+    """
+
+    def __init__(self, client=None):
+        """Construct object.
+
+        Parameters
+        ----------
+        client : object, optional
+            Modbus TCP client to share, with the same interface as
+            `pyModbusTCP.client.ModbusClient`. Defaults to a pyModbusTCP client.
+        """
+        if client is None:
+            client = pyModbusTCP.client.ModbusClient()
+        object.__setattr__(self, "client", client)
+
+        # number of reads merged into an identical pending read
+        object.__setattr__(self, "merged", 0)
+
+        # heap of (priority, sequence number, key, future, method, args) and pending
+        # reads by key
+        object.__setattr__(self, "_heap", [])
+        object.__setattr__(self, "_pending", {})
+        object.__setattr__(self, "_sequence", itertools.count())
+        object.__setattr__(self, "_lock", threading.Lock())
+        object.__setattr__(self, "_ready", threading.Condition(self._lock))
+        object.__setattr__(self, "_local", threading.local())
+        object.__setattr__(self, "_thread", None)
+
+        for name in READS:
+            object.__setattr__(self, name, self._wrap(name, read=True))
+        for name in WRITES:
+            object.__setattr__(self, name, self._wrap(name, read=False))
+        if hasattr(client, "pipeline"):
+            object.__setattr__(self, "pipeline", self._pipeline)
+
+    def __getattr__(self, name):
+        """Get an attribute of the wrapped client."""
+        if name in UNSHARED:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        return getattr(self.client, name)
+
+    def __setattr__(self, name, value):
+        """Set an attribute of the wrapped client."""
+        setattr(self.client, name, value)
+
+    @contextlib.contextmanager
+    def control(self):
+        """Run reads made by the calling thread at `CONTROL` priority."""
+        previous = getattr(self._local, "priority", POLL)
+        self._local.priority = CONTROL
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    @property
+    def queued(self):
+        """Number of requests waiting to run."""
+        with self._lock:
+            return len({id(entry[3]) for entry in self._heap if not entry[3].done()})
+
+    def open(self):
+        """Open the connection.
+
+        Returns
+        -------
+        success : bool
+            `True` if the connection is open.
+        """
+        return self._submit(CONTROL, None, self.client.open, ()).result()
+
+    def close(self):
+        """Close the connection."""
+        return self._submit(CONTROL, None, self.client.close, ()).result()
+
+    def _wrap(self, name, read):
+        """Wrap a request method to run it on the dispatcher thread.
+
+        Parameters
+        ----------
+        name : str
+            Name of the request method of the client.
+        read : bool
+            The request is a read that can be merged with an identical pending read.
+
+        Returns
+        -------
+        wrapper : callable
+            Wrapped request method.
+        """
+        request = getattr(self.client, name)
+
+        if read:
+
+            def wrapper(address, count=1):
+                priority = getattr(self._local, "priority", POLL)
+                key = (name, address, count)
+                result = self._submit(priority, key, request, (address, count)).result()
+                # merged callers share the result so give each its own copy
+                return None if result is None else list(result)
+
+        else:
+
+            def wrapper(address, value):
+                return self._submit(CONTROL, None, request, (address, value)).result()
+
+        return wrapper
+
+    def _pipeline(self, requests):
+        """Make several requests as one pipeline on the dispatcher thread.
+
+        Parameters
+        ----------
+        requests : list of tuple
+            Requests as (client method name, address, count or value(s)) tuples.
+
+        Returns
+        -------
+        results : list
+            Result of each request, in the same order as `requests`.
+        """
+        if any(name in WRITES for name, _, _ in requests):
+            priority = CONTROL
+        else:
+            priority = getattr(self._local, "priority", POLL)
+
+        return self._submit(priority, None, self.client.pipeline, (requests,)).result()
+
+    def _submit(self, priority, key, method, args):
+        """Queue a request.
+
+        Parameters
+        ----------
+        priority : int
+            Request priority, `CONTROL` or `POLL`.
+        key : hashable or None
+            Key of a read that can be merged, or `None` if it can't be.
+        method : callable
+            Method to call on the dispatcher thread.
+        args : tuple
+            Arguments of the method.
+
+        Returns
+        -------
+        future : concurrent.futures.Future
+            Future holding the result of the request.
+        """
+        with self._lock:
+            if key in self._pending:
+                object.__setattr__(self, "merged", self.merged + 1)
+                entry = self._pending[key]
+                future = entry[3]
+                if priority < entry[0]:
+                    # queue the pending read again at the higher priority, it runs
+                    # from whichever entry comes first
+                    entry = (priority, next(self._sequence), key, future, method, args)
+                    self._pending[key] = entry
+                    heapq.heappush(self._heap, entry)
+                return future
+
+            future = concurrent.futures.Future()
+            entry = (priority, next(self._sequence), key, future, method, args)
+            if key is not None:
+                self._pending[key] = entry
+            heapq.heappush(self._heap, entry)
+
+            if (self._thread is None) or not self._thread.is_alive():
+                thread = threading.Thread(target=self._dispatch, daemon=True)
+                object.__setattr__(self, "_thread", thread)
+                thread.start()
+
+            self._ready.notify()
+
+        return future
+
+    def _dispatch(self):
+        """Run queued requests one at a time.
+
+        This method runs in its own thread.
+        """
+        while True:
+            with self._lock:
+                while not self._heap:
+                    self._ready.wait()
+                _, _, key, future, method, args = heapq.heappop(self._heap)
+                pending = self._pending.get(key)
+                if (pending is not None) and (pending[3] is future):
+                    del self._pending[key]
+
+                # skip a read already run from an entry with higher priority
+                if future.running() or future.done():
+                    continue
+                future.set_running_or_notify_cancel()
+
+            try:
+                result = method(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
@@ -0,0 +1,273 @@
+"""Simulated PET-7019Z/ET-7019Z served over Modbus TCP.
+
+The simulator implements the parts of the register map used by `xet7019z` so the
+driver can be exercised and benchmarked without an instrument.
+"""
+
+import math
+import random
+import threading
+import time
+
+from pyModbusTCP.server import DataBank, DataHandler, ModbusServer
+
+from .xet7019z import _hex_limits, _scale_table, xet7019z
+
+
+class _DataHandler(DataHandler):
+    """Data handler that generates AI signals and injects latency."""
+
+    def __init__(self, simulator):
+        """Construct object.
+
+        Parameters
+        ----------
+        simulator : SimulatedXet7019z
+            Simulator owning the data bank.
+        """
+        super().__init__(simulator.data_bank)
+        self.simulator = simulator
+
+    def read_coils(self, address, count, srv_info):
+        """Read coils."""
+        self.simulator._transact()
+        return super().read_coils(address, count, srv_info)
+
+    def read_d_inputs(self, address, count, srv_info):
+        """Read discrete inputs."""
+        self.simulator._transact()
+        return super().read_d_inputs(address, count, srv_info)
+
+    def read_h_regs(self, address, count, srv_info):
+        """Read holding registers."""
+        self.simulator._transact()
+        return super().read_h_regs(address, count, srv_info)
+
+    def read_i_regs(self, address, count, srv_info):
+        """Read input registers, updating AI values from their signals first."""
+        self.simulator._transact()
+        self.simulator._update_ai(address, count)
+        return super().read_i_regs(address, count, srv_info)
+
+    def write_coils(self, address, bits_l, srv_info):
+        """Write coils, handling the reset command coil."""
+        self.simulator._transact()
+        result = super().write_coils(address, bits_l, srv_info)
+
+        if address <= 226 < address + len(bits_l) and bits_l[226 - address]:
+            self.simulator.reset()
+
+        return result
+
+    def write_h_regs(self, address, words_l, srv_info):
+        """Write holding registers."""
+        self.simulator._transact()
+        return super().write_h_regs(address, words_l, srv_info)
+
+
+class SimulatedXet7019z:
+    """Simulated PET-7019Z/ET-7019Z analog input DAQ instrument.
+
+    AI values are generated from a signal function per channel, converted to ADC
+    counts using the AI range setting of the channel and the AI data format. Latency
+    and jitter can be injected into every Modbus transaction.
+    """
+
+    def __enter__(self):
+        """Enter the runtime context related to this object."""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Exit the runtime context related to this object.
+
+        Make sure the server gets stopped.
+        """
+        self.stop()
+
+    def __init__(
+        self,
+        host="localhost",
+        port=5020,
+        signals=None,
+        latency=0,
+        jitter=0,
+        default_ai_range=8,
+        model=0x7019,
+        os_version=0x100,
+        fw_version=0x100,
+        io_version=0x100,
+    ):
+        """Construct object.
+
+        Parameters
+        ----------
+        host : str
+            Server host.
+        port : int
+            Server port.
+        signals : dict, optional
+            Signal functions keyed by channel. Each function takes the time in seconds
+            since the simulator started and returns a value in engineering units.
+            Channels without a signal generate a 1 Hz sine wave at half full scale.
+        latency : float
+            Delay added to every Modbus transaction in seconds.
+        jitter : float
+            Maximum random delay added on top of `latency` in seconds.
+        default_ai_range : int
+            AI range setting of all channels after a reset.
+        model : int
+            Model number returned in holding register 559.
+        os_version, fw_version, io_version : int
+            Versions returned in input registers 350, 351 and 353. Each hex digit is
+            one component of the version number.
+        """
+        self.host = host
+        self.port = port
+        self.signals = dict(signals or {})
+        self.latency = latency
+        self.jitter = jitter
+        self.default_ai_range = default_ai_range
+
+        # number of Modbus transactions served
+        self.transactions = 0
+
+        self._lock = threading.Lock()
+        self._start_time = time.monotonic()
+
+        self.data_bank = DataBank()
+        self.data_bank.set_holding_registers(559, [model])
+        self.data_bank.set_input_registers(350, [os_version, fw_version])
+        self.data_bank.set_input_registers(353, [io_version])
+        self.reset()
+
+        self.server = ModbusServer(
+            host, port, no_block=True, data_hdl=_DataHandler(self)
+        )
+
+    def start(self):
+        """Start serving."""
+        self._start_time = time.monotonic()
+        self.server.start()
+
+    def stop(self):
+        """Stop serving."""
+        self.server.stop()
+
+    def reset(self):
+        """Reset the I/O configuration to the default, like coil 226 does."""
+        channels = xet7019z.ai_channels
+
+        self.data_bank.set_holding_registers(427, [self.default_ai_range] * channels)
+        self.data_bank.set_holding_registers(491, [0] * channels)
+        self.data_bank.set_coils(595, [True] * channels)
+
+        # reset command, CJC, noise filter and data format coils
+        self.data_bank.set_coils(226, [False])
+        self.data_bank.set_coils(627, [True])
+        self.data_bank.set_coils(629, [False])
+        self.data_bank.set_coils(631, [False])
+
+    def set_signal(self, channel, signal):
+        """Set the signal function of a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to set, 0-indexed.
+        signal : callable
+            Function taking the time in seconds since the simulator started and
+            returning a value in engineering units.
+        """
+        self.signals[channel] = signal
+
+    def _transact(self):
+        """Count a transaction and apply the injected latency."""
+        with self._lock:
+            self.transactions += 1
+
+        delay = self.latency
+        if self.jitter > 0:
+            delay += random.uniform(0, self.jitter)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _signal(self, channel, t, ai_range):
+        """Evaluate the signal of a channel.
+
+        Parameters
+        ----------
+        channel : int
+            Channel to evaluate, 0-indexed.
+        t : float
+            Time in seconds since the simulator started.
+        ai_range : int
+            AI range setting of the channel.
+
+        Returns
+        -------
+        eng : float
+            Value in engineering units.
+        """
+        try:
+            signal = self.signals[channel]
+        except KeyError:
+            setting = xet7019z.ai_ranges[ai_range]
+            amplitude = (setting["max"] - setting["min"]) / 4
+            centre = (setting["max"] + setting["min"]) / 2
+            return centre + amplitude * math.sin(
+                2 * math.pi * t + channel * math.pi / 5
+            )
+
+        return signal(t)
+
+    def _update_ai(self, address, count):
+        """Regenerate AI input registers covered by a read.
+
+        Parameters
+        ----------
+        address : int
+            Start address of the read.
+        count : int
+            Number of registers read.
+        """
+        channels = range(max(address, 0), min(address + count, xet7019z.ai_channels))
+        if len(channels) == 0:
+            return
+
+        t = time.monotonic() - self._start_time
+        ai_ranges = self.data_bank.get_holding_registers(427, xet7019z.ai_channels)
+
+        data_format = "eng" if self.data_bank.get_coils(631)[0] else "hex"
+        units_per_count, offsets, unsigned = _scale_table(data_format)
+
+        values = []
+        for channel in channels:
+            ai_range = ai_ranges[channel]
+            setting = xet7019z.ai_ranges[ai_range]
+
+            # counts at the range limits, which must fit in 16 bits or the scale of
+            # the range is wrong
+            if data_format == "eng":
+                limits = [
+                    round(setting[key] / setting["eng_scale"]) for key in ["min", "max"]
+                ]
+            else:
+                limits = list(_hex_limits(setting))
+            low, high = (0, 0xFFFF) if unsigned[ai_range] else (-0x8000, 0x7FFF)
+            if not all(low <= limit <= high for limit in limits):
+                raise ValueError(
+                    f"Invalid AI range {ai_range} scale: full scale of {limits} counts "
+                    + "doesn't fit in a 16 bit register."
+                )
+
+            eng = self._signal(channel, t, ai_range)
+            counts = round(
+                (eng - float(offsets[ai_range])) / float(units_per_count[ai_range])
+            )
+
+            # signals beyond the range read as its limits, like an over-range input
+            counts = max(min(limits), min(max(limits), counts))
+            values.append(counts & 0xFFFF)
+
+        self.data_bank.set_input_registers(channels[0], values)
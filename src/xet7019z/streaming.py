@@ -0,0 +1,178 @@
+"""Streaming per-channel statistics and data reduction for scans."""
+
+import numpy as np
+
+
+class RunningStats:
+    """Running per-channel mean, variance, minimum and maximum.
+
+    Statistics are updated with Welford's algorithm, combined block-wise so that
+    blocks of scans can be added in one vectorised call, and use a constant amount
+    of memory however many scans are added.
+    """
+
+    def __init__(self, n_channels):
+        """Construct object.
+
+        Parameters
+        ----------
+        n_channels : int
+            Number of channels in each scan.
+        """
+        self.n_channels = n_channels
+        self.reset()
+
+    def reset(self):
+        """Discard all statistics."""
+        self.count = 0
+        self._mean = np.zeros(self.n_channels)
+        self._m2 = np.zeros(self.n_channels)
+        self._min = np.full(self.n_channels, np.inf)
+        self._max = np.full(self.n_channels, -np.inf)
+
+    def update(self, values):
+        """Add scans to the statistics.
+
+        Parameters
+        ----------
+        values : array-like of float
+            One scan with one value per channel, or a 2D block of scans with one row
+            per scan.
+        """
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+        n_block = len(values)
+        if n_block == 0:
+            return
+
+        mean_block = values.mean(axis=0)
+        m2_block = ((values - mean_block) ** 2).sum(axis=0)
+
+        # combine the block statistics with the running statistics
+        count = self.count + n_block
+        delta = mean_block - self._mean
+        self._mean += delta * n_block / count
+        self._m2 += m2_block + delta**2 * self.count * n_block / count
+        self.count = count
+
+        np.minimum(self._min, values.min(axis=0), out=self._min)
+        np.maximum(self._max, values.max(axis=0), out=self._max)
+
+    @property
+    def mean(self):
+        """Mean of each channel."""
+        return self._mean.copy()
+
+    @property
+    def variance(self):
+        """Sample variance of each channel, NaN until two scans have been added."""
+        if self.count < 2:
+            return np.full(self.n_channels, np.nan)
+
+        return self._m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        """Sample standard deviation of each channel."""
+        return np.sqrt(self.variance)
+
+    @property
+    def min(self):
+        """Minimum of each channel."""
+        return self._min.copy()
+
+    @property
+    def max(self):
+        """Maximum of each channel."""
+        return self._max.copy()
+
+    def snapshot(self):
+        """Get all statistics.
+
+        Returns
+        -------
+        snapshot : dict
+            "count" plus lists of the "mean", "variance", "std", "min" and "max" of
+            each channel.
+        """
+        return {
+            "count": self.count,
+            "mean": self.mean.tolist(),
+            "variance": self.variance.tolist(),
+            "std": self.std.tolist(),
+            "min": self.min.tolist(),
+            "max": self.max.tolist(),
+        }
+
+
+class BlockReducer:
+    """Reduce every N scans to one record by block averaging or decimation.
+
+    Scans that don't complete a block are held until the next update, so at most
+    N - 1 scans are buffered.
+    """
+
+    def __init__(self, n, mode="mean"):
+        """Construct object.
+
+        Parameters
+        ----------
+        n : int
+            Number of scans per record.
+        mode : str, {"mean", "decimate"}
+            Emit the mean of each block of scans ("mean"), or the first scan of each
+            block ("decimate").
+        """
+        if n < 1:
+            raise ValueError(f"Invalid block size: {n}. Must be >= 1.")
+        if mode not in ("mean", "decimate"):
+            raise ValueError(f"Invalid mode: {mode}. Must be 'mean' or 'decimate'.")
+
+        self.n = n
+        self.mode = mode
+        self._timestamps = np.zeros(0)
+        self._values = None
+
+    def update(self, timestamps, values):
+        """Add scans and get the records for all completed blocks.
+
+        Parameters
+        ----------
+        timestamps : float or array-like of float
+            Timestamp of each scan.
+        values : array-like of float
+            One scan with one value per channel, or a 2D block of scans with one row
+            per scan.
+
+        Returns
+        -------
+        timestamps : numpy.ndarray of float64
+            Timestamp of each record, the mean timestamp of its block in "mean" mode
+            or the timestamp of its first scan in "decimate" mode.
+        values : numpy.ndarray of float64
+            Records with one row per completed block and one column per channel.
+        """
+        timestamps = np.atleast_1d(np.asarray(timestamps, dtype=float))
+        values = np.atleast_2d(np.asarray(values, dtype=float))
+
+        if self._values is not None:
+            timestamps = np.concatenate((self._timestamps, timestamps))
+            values = np.concatenate((self._values, values))
+
+        complete = (len(values) // self.n) * self.n
+        blocks = values[:complete].reshape(-1, self.n, values.shape[1])
+        block_timestamps = timestamps[:complete].reshape(-1, self.n)
+
+        if self.mode == "mean":
+            records = (block_timestamps.mean(axis=1), blocks.mean(axis=1))
+        else:
+            records = (block_timestamps[:, 0].copy(), blocks[:, 0].copy())
+
+        self._timestamps = timestamps[complete:].copy()
+        self._values = values[complete:].copy()
+
+        return records
+
+    def reset(self):
+        """Discard buffered scans."""
+        self._timestamps = np.zeros(0)
+        self._values = None
@@ -0,0 +1,169 @@
+"""Opt-in tracing of instrument method calls and Modbus requests.
+
+Traces are saved in the Chrome trace event format, which can be opened in Perfetto
+(https://ui.perfetto.dev) or chrome://tracing. Each instrument method call and each
+Modbus request it makes is recorded as a span on the thread that made it, so nested
+calls show up as nested spans.
+"""
+
+import json
+import os
+import threading
+import time
+
+from .proxy import ClientProxy, unwrap_methods, wrap_methods
+
+
+class TracedClient(ClientProxy):
+    """Modbus client proxy that records every request as a span.
+
+    Attributes other than the request methods are passed through to the wrapped
+    client.
+    """
+
+    def __init__(self, client, tracer):
+        """Construct object.
+
+        Parameters
+        ----------
+        client : pyModbusTCP.client.ModbusClient
+            Modbus client to wrap.
+        tracer : Tracer
+            Tracer to record spans in.
+        """
+        object.__setattr__(self, "tracer", tracer)
+        super().__init__(client)
+
+    def _record(self, name, function_code, address, value, result, error, start, end):
+        """Record a request as a span, see `ClientProxy._record`."""
+        args = {"function_code": function_code, "address": address}
+        if isinstance(value, (list, tuple)):
+            args["count"] = len(value)
+        else:
+            args["value"] = value
+        args["ok"] = result is not None
+        self.tracer.record(name, "modbus", start, end, args)
+
+
+class Tracer:
+    """Recorder of instrument method and Modbus request spans.
+
+    One tracer can be attached to several instrument objects, e.g. to see how calls
+    from different threads interleave.
+    """
+
+    def __init__(self):
+        """Construct object."""
+        self._lock = threading.Lock()
+        self._events = []
+        self._thread_names = {}
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def record(self, name, category, start, end, args=None):
+        """Record a span.
+
+        Parameters
+        ----------
+        name : str
+            Span name.
+        category : str
+            Span category.
+        start : float
+            Start time from `time.perf_counter` in seconds.
+        end : float
+            End time from `time.perf_counter` in seconds.
+        args : dict, optional
+            Extra data shown with the span. It may be updated until the trace is
+            saved.
+        """
+        thread = threading.current_thread()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": 1e6 * (start - self._origin),
+            "dur": 1e6 * (end - start),
+            "pid": self._pid,
+            "tid": thread.ident,
+            "args": args if args is not None else {},
+        }
+
+        with self._lock:
+            self._events.append(event)
+            self._thread_names[thread.ident] = thread.name
+
+    def clear(self):
+        """Discard all recorded spans."""
+        with self._lock:
+            self._events = []
+            self._thread_names = {}
+
+    def attach(self, daq):
+        """Start tracing the method calls and Modbus requests of an instrument.
+
+        If tracing is combined with metrics (`xet7019z.enable_metrics`), disable them
+        in the reverse order they were enabled.
+
+        Parameters
+        ----------
+        daq : xet7019z
+            Instrument object.
+        """
+        daq.instr = TracedClient(daq.instr, self)
+
+        category = type(daq).__name__
+
+        def record(name, args, start, end):
+            self.record(name, category, start, end, {"args": repr(args)})
+
+        wrap_methods(daq, record, tracer=self)
+
+    def detach(self, daq):
+        """Stop tracing an instrument.
+
+        Parameters
+        ----------
+        daq : xet7019z
+            Instrument object previously passed to `attach`.
+        """
+        if isinstance(daq.instr, TracedClient):
+            daq.instr = daq.instr.client
+
+        unwrap_methods(daq, lambda attr: getattr(attr, "tracer", None) is self)
+
+    def to_dict(self):
+        """Get the trace in the Chrome trace event format.
+
+        Returns
+        -------
+        trace : dict
+            Trace events.
+        """
+        with self._lock:
+            metadata = [
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": self._pid,
+                    "tid": tid,
+                    "args": {"name": thread_name},
+                }
+                for tid, thread_name in self._thread_names.items()
+            ]
+
+            return {
+                "traceEvents": metadata + list(self._events),
+                "displayTimeUnit": "ms",
+            }
+
+    def save(self, path):
+        """Save the trace as a Chrome trace event JSON file.
+
+        Parameters
+        ----------
+        path : str or path-like
+            File path.
+        """
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f)
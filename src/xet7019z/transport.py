@@ -0,0 +1,501 @@
+"""Lightweight Modbus TCP transport with preallocated buffers and zero-copy decoding."""
+
+import socket
+import warnings
+
+import numpy as np
+
+from .proxy import FUNCTION_CODES
+from .modbus import (
+    MAX_FRAME,
+    MBAP_HEADER,
+    READ_BITS,
+    READ_COILS,
+    READ_DISCRETE_INPUTS,
+    READ_HOLDING_REGISTERS,
+    READ_INPUT_REGISTERS,
+    READ_REGISTERS,
+    READ_RESPONSE,
+    REQUEST,
+    WRITE_SINGLE_COIL,
+    WRITE_SINGLE_REGISTER,
+    WRITE_MULTIPLE_COILS,
+    WRITE_MULTIPLE_REGISTERS,
+    ModbusError,
+    _pack_bits,
+    check_header,
+    check_response,
+)
+
+# number of pipelines in a row that time out before falling back to serial requests
+PIPELINE_TIMEOUTS = 3
+
+
+class ModbusTransport:
+    """Minimal Modbus TCP client for the function codes used by the ET-7019Z.
+
+    Requests are built in a preallocated frame and responses are received into a
+    preallocated buffer with `socket.recv_into`. Register and coil values are decoded
+    with NumPy straight from the buffer, and `read_input_registers_view` returns a
+    signed view of the buffer without copying it at all, so a transaction allocates
+    very little.
+
+    `pipeline` sends a batch of requests back to back with up to `max_in_flight`
+    transactions outstanding, matching responses to requests by transaction id, so
+    the batch costs about one round trip instead of one per request. If the
+    instrument doesn't cope with pipelining the transport falls back to serial
+    requests.
+
+    Failed requests raise exceptions instead of returning `None`: `ModbusError` for
+    exception responses and malformed frames, and `OSError` for connection problems,
+    after which the connection is closed. The client can be passed to `xet7019z` in
+    place of the default pyModbusTCP client.
+    """
+
+    def __init__(
+        self, host="localhost", port=502, unit_id=1, timeout=30, max_in_flight=1
+    ):
+        """Construct object.
+
+        Parameters
+        ----------
+        host : str
+            Server host.
+        port : int
+            Server port.
+        unit_id : int
+            Modbus unit identifier.
+        timeout : float
+            Connect and response timeout in seconds.
+        max_in_flight : int
+            Maximum number of transactions outstanding at once in `pipeline`. 1 sends
+            requests serially.
+        """
+        self.host = host
+        self.port = port
+        self.unit_id = unit_id
+        self._timeout = timeout
+        self.max_in_flight = max_in_flight
+
+        # number of connections opened, so cached instrument state can be
+        # invalidated after a reconnect
+        self.connections = 0
+
+        self._sock = None
+        self._transaction_id = 0
+
+        # number of pipelines in a row that timed out
+        self._pipeline_timeouts = 0
+
+        self._tx = bytearray(MAX_FRAME)
+        self._rx = bytearray(MAX_FRAME)
+        self._rx_view = memoryview(self._rx)
+
+    @property
+    def timeout(self):
+        """Connect and response timeout in seconds."""
+        return self._timeout
+
+    @timeout.setter
+    def timeout(self, value):
+        self._timeout = value
+        if self._sock is not None:
+            self._sock.settimeout(value)
+
+    @property
+    def is_open(self):
+        """Connection is open."""
+        return self._sock is not None
+
+    def open(self):
+        """Open the connection.
+
+        Returns
+        -------
+        opened : bool
+            The connection was opened.
+        """
+        self.close()
+
+        try:
+            self._sock = socket.create_connection((self.host, self.port), self._timeout)
+        except OSError:
+            return False
+
+        self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.connections += 1
+
+        return True
+
+    def close(self):
+        """Close the connection."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _recv_into(self, offset, n):
+        """Receive exactly `n` bytes into the receive buffer.
+
+        Parameters
+        ----------
+        offset : int
+            Position in the buffer of the first byte.
+        n : int
+            Number of bytes to receive.
+        """
+        end = offset + n
+        while offset < end:
+            received = self._sock.recv_into(self._rx_view[offset:end])
+            if received == 0:
+                raise ConnectionError(
+                    f"Connection to {self.host}:{self.port} closed by the server."
+                )
+            offset += received
+
+    def _build(self, function_code, address, value):
+        """Build a request PDU in the frame buffer.
+
+        Parameters
+        ----------
+        function_code : int
+            Modbus function code.
+        address : int
+            Start address.
+        value : int, bool or list
+            Number of items to read for read requests, the value to write for single
+            write requests, or the list of values to write for multiple write requests.
+
+        Returns
+        -------
+        length : int
+            Length of the PDU.
+        """
+        offset = MBAP_HEADER.size + REQUEST.size
+
+        if function_code == WRITE_MULTIPLE_COILS:
+            packed = _pack_bits(value)
+            REQUEST.pack_into(
+                self._tx, MBAP_HEADER.size, function_code, address, len(value)
+            )
+            self._tx[offset] = len(packed)
+            self._tx[offset + 1 : offset + 1 + len(packed)] = packed
+            return REQUEST.size + 1 + len(packed)
+        elif function_code == WRITE_MULTIPLE_REGISTERS:
+            REQUEST.pack_into(
+                self._tx, MBAP_HEADER.size, function_code, address, len(value)
+            )
+            self._tx[offset] = 2 * len(value)
+            np.frombuffer(self._tx, ">u2", len(value), offset + 1)[:] = value
+            return REQUEST.size + 1 + 2 * len(value)
+        elif function_code == WRITE_SINGLE_COIL:
+            value = 0xFF00 if value else 0
+        elif function_code not in READ_BITS + READ_REGISTERS + (WRITE_SINGLE_REGISTER,):
+            raise ValueError(f"Unsupported function code: {function_code}.")
+
+        REQUEST.pack_into(self._tx, MBAP_HEADER.size, function_code, address, value)
+
+        return REQUEST.size
+
+    def _send(self, length):
+        """Send the request in the frame buffer with a new transaction id.
+
+        Parameters
+        ----------
+        length : int
+            Length of the request PDU in the frame buffer.
+
+        Returns
+        -------
+        transaction_id : int
+            Transaction id of the request.
+        """
+        if self._sock is None:
+            raise ConnectionError(f"Not connected to {self.host}:{self.port}.")
+
+        self._transaction_id = (self._transaction_id + 1) & 0xFFFF
+        MBAP_HEADER.pack_into(
+            self._tx, 0, self._transaction_id, 0, length + 1, self.unit_id
+        )
+        self._sock.sendall(memoryview(self._tx)[: MBAP_HEADER.size + length])
+
+        return self._transaction_id
+
+    def _receive(self):
+        """Receive a response into the receive buffer.
+
+        Returns
+        -------
+        transaction_id : int
+            Transaction id of the response.
+        length : int
+            Length of the response PDU, which starts after the MBAP header.
+        """
+        self._recv_into(0, MBAP_HEADER.size)
+        transaction_id, protocol_id, length, _ = MBAP_HEADER.unpack_from(self._rx)
+        check_header(protocol_id, length)
+        self._recv_into(MBAP_HEADER.size, length - 1)
+
+        return transaction_id, length - 1
+
+    def _transact(self, function_code, address, value):
+        """Make a request and receive its response.
+
+        Parameters
+        ----------
+        function_code : int
+            Modbus function code.
+        address : int
+            Start address.
+        value : int, bool or list
+            See `_build`.
+
+        Returns
+        -------
+        length : int
+            Length of the response PDU in the receive buffer.
+        """
+        length = self._build(function_code, address, value)
+
+        try:
+            transaction_id = self._send(length)
+            response_id, length = self._receive()
+            if response_id != transaction_id:
+                raise ModbusError(
+                    f"Unexpected transaction id in response: {response_id}. Expected "
+                    + f"{transaction_id}."
+                )
+        except (OSError, ModbusError):
+            # the stream can't be trusted after a partial or malformed frame
+            self.close()
+            raise
+
+        return length
+
+    def _check(self, function_code, count, length):
+        """Check the response in the receive buffer and view its data bytes.
+
+        Parameters
+        ----------
+        function_code : int
+            Function code of the request.
+        count : int or None
+            Number of coils or registers requested by a read request, `None` for
+            write requests.
+        length : int
+            Length of the response PDU.
+
+        Returns
+        -------
+        data : numpy.ndarray of uint8 or None
+            View of the data bytes of a read response, `None` for a write response.
+        """
+        pdu = self._rx_view[MBAP_HEADER.size : MBAP_HEADER.size + length]
+        check_response(function_code, pdu, count)
+
+        if function_code in READ_BITS + READ_REGISTERS:
+            offset = MBAP_HEADER.size + READ_RESPONSE.size
+            return np.frombuffer(self._rx, np.uint8, pdu[1], offset)
+
+    def _decode(self, function_code, value, length):
+        """Decode the response in the receive buffer.
+
+        Parameters
+        ----------
+        function_code : int
+            Function code of the request.
+        value : int, bool or list
+            See `_build`.
+        length : int
+            Length of the response PDU.
+
+        Returns
+        -------
+        result : list of bool, list of int or bool
+            Bit values for bit reads, register values for register reads, or `True`
+            for writes.
+        """
+        if function_code in READ_BITS:
+            packed = self._check(function_code, value, length)
+            return (
+                np.unpackbits(packed, count=value, bitorder="little")
+                .astype(bool)
+                .tolist()
+            )
+        elif function_code in READ_REGISTERS:
+            return self._check(function_code, value, length).view(">u2").tolist()
+        else:
+            self._check(function_code, None, length)
+            return True
+
+    def _request(self, function_code, address, value):
+        """Make a request and decode its response.
+
+        Parameters
+        ----------
+        function_code : int
+            Modbus function code.
+        address : int
+            Start address.
+        value : int, bool or list
+            See `_build`.
+
+        Returns
+        -------
+        result : list of bool, list of int or bool
+            See `_decode`.
+        """
+        length = self._transact(function_code, address, value)
+
+        return self._decode(function_code, value, length)
+
+    def pipeline(self, requests):
+        """Make several requests with up to `max_in_flight` outstanding at once.
+
+        Requests are sent in order, but the instrument may execute them in any order
+        while they're in flight, so don't pipeline requests that depend on each other.
+        If the responses can't be matched to the requests, i.e. the instrument can't
+        handle pipelining, `max_in_flight` is set to 1, the connection is reopened
+        and the requests are made again serially. So it is after `PIPELINE_TIMEOUTS`
+        pipelines in a row time out, as firmware may drop requests in flight rather
+        than answer them. Other connection problems close the connection and raise
+        like any other request.
+
+        Parameters
+        ----------
+        requests : list of tuple
+            Requests as (method name, address, count or value(s)) tuples, e.g.
+            `("read_holding_registers", 427, 10)`.
+
+        Returns
+        -------
+        results : list
+            Result of each request, in the same order as `requests`.
+        """
+        function_codes = []
+        for name, _, _ in requests:
+            if name not in FUNCTION_CODES:
+                raise ValueError(f"Unsupported request: {name}.")
+            function_codes.append(FUNCTION_CODES[name])
+
+        if (self.max_in_flight <= 1) or (len(requests) <= 1):
+            return [
+                self._request(function_code, address, value)
+                for function_code, (_, address, value) in zip(function_codes, requests)
+            ]
+
+        if self._sock is None:
+            raise ConnectionError(f"Not connected to {self.host}:{self.port}.")
+
+        results = [None] * len(requests)
+        errors = []
+
+        # index of the request of each transaction in flight
+        in_flight = {}
+        sent = 0
+
+        # reason to fall back to serial requests, if any
+        reason = None
+
+        try:
+            while (sent < len(requests)) or in_flight:
+                while (sent < len(requests)) and (len(in_flight) < self.max_in_flight):
+                    _, address, value = requests[sent]
+                    length = self._build(function_codes[sent], address, value)
+                    in_flight[self._send(length)] = sent
+                    sent += 1
+
+                transaction_id, length = self._receive()
+                if transaction_id not in in_flight:
+                    reason = f"unexpected transaction id in response: {transaction_id}"
+                    break
+
+                i = in_flight.pop(transaction_id)
+                try:
+                    results[i] = self._decode(function_codes[i], requests[i][2], length)
+                except ModbusError as e:
+                    # the stream is still in sync so collect the remaining responses
+                    errors.append(e)
+        except socket.timeout:
+            # a single timeout may just be the network, so only repeated ones are put
+            # down to pipelining
+            self.close()
+            self._pipeline_timeouts += 1
+            if self._pipeline_timeouts < PIPELINE_TIMEOUTS:
+                raise
+            reason = f"{self._pipeline_timeouts} timeouts in a row"
+        except (OSError, ModbusError):
+            # the stream can't be trusted after a partial or malformed frame
+            self.close()
+            raise
+
+        if reason is not None:
+            self.close()
+            warnings.warn(
+                f"Pipelined requests to {self.host}:{self.port} failed ({reason}), "
+                + "falling back to serial requests."
+            )
+            self.max_in_flight = 1
+            if not self.open():
+                raise ConnectionError(
+                    f"Failed to reconnect to {self.host}:{self.port}."
+                )
+            return self.pipeline(requests)
+
+        self._pipeline_timeouts = 0
+
+        if errors:
+            raise errors[0]
+
+        return results
+
+    def read_coils(self, address, count=1):
+        """Read coils (function code 1)."""
+        return self._request(READ_COILS, address, count)
+
+    def read_discrete_inputs(self, address, count=1):
+        """Read discrete inputs (function code 2)."""
+        return self._request(READ_DISCRETE_INPUTS, address, count)
+
+    def read_holding_registers(self, address, count=1):
+        """Read holding registers (function code 3)."""
+        return self._request(READ_HOLDING_REGISTERS, address, count)
+
+    def read_input_registers(self, address, count=1):
+        """Read input registers (function code 4)."""
+        return self._request(READ_INPUT_REGISTERS, address, count)
+
+    def read_input_registers_view(self, address, count=1):
+        """Read input registers (function code 4) as signed values without copying.
+
+        Parameters
+        ----------
+        address : int
+            Start address.
+        count : int
+            Number of registers to read.
+
+        Returns
+        -------
+        registers : numpy.ndarray of >i2
+            View of the signed register values in the receive buffer. It's
+            overwritten by the next request, so copy it to keep it.
+        """
+        length = self._transact(READ_INPUT_REGISTERS, address, count)
+
+        return self._check(READ_INPUT_REGISTERS, count, length).view(">i2")
+
+    def write_single_coil(self, address, value):
+        """Write a single coil (function code 5)."""
+        return self._request(WRITE_SINGLE_COIL, address, value)
+
+    def write_single_register(self, address, value):
+        """Write a single register (function code 6)."""
+        return self._request(WRITE_SINGLE_REGISTER, address, value)
+
+    def write_multiple_coils(self, address, values):
+        """Write multiple coils (function code 15)."""
+        return self._request(WRITE_MULTIPLE_COILS, address, values)
+
+    def write_multiple_registers(self, address, values):
+        """Write multiple registers (function code 16)."""
+        return self._request(WRITE_MULTIPLE_REGISTERS, address, values)
@@ -7,10 +7,141 @@ The modbus register table can be found at
 https://www.icpdas-usa.com/documents/pet_et7000_register_table_v101.pdf.
 """
 
+import collections
+import json
+import time
 import warnings
 
+import numpy as np
 import pyModbusTCP.client
 
+from . import metrics
+from .registers import CONFIG_FIELDS, REGISTER_MAP, read_fields
+
+__all__ = ["xet7019z", "Identity", "adc_to_eng", "save_config", "load_config"]
+
+
+def _twos_complement(value):
+    """Calculate decimal value from signed 2's complement.
+
+    Parameters
+    ----------
+    value : int
+        Decimal value from instrument.
+
+    Returns
+    -------
+    value : int
+        Signed decimal value derived from hex 2's complement.
+    """
+    # rescale the value from -32768 to 32767 (16 bit)
+    if (value & (1 << (16 - 1))) != 0:
+        value -= 1 << 16
+
+    return value
+
+
+def _is_unsigned(ai_range_setting):
+    """Check whether the hex format ADC counts of an AI range are unsigned.
+
+    Unsigned ranges, i.e. 4-20 mA and 0-20 mA, span 0x0000 to 0xFFFF rather than a
+    two's complement span such as 0x8000 to 0x7FFF. They are marked with an
+    "unsigned" key in `xet7019z.ai_ranges`.
+
+    Parameters
+    ----------
+    ai_range_setting : dict
+        AI range parameters, see `xet7019z.ai_ranges`.
+
+    Returns
+    -------
+    unsigned : bool
+        `True` if the hex format counts are unsigned.
+    """
+    return ai_range_setting.get("unsigned", False)
+
+
+def _hex_limits(ai_range_setting):
+    """Get the hex format ADC counts at the limits of an AI range.
+
+    Parameters
+    ----------
+    ai_range_setting : dict
+        AI range parameters, see `xet7019z.ai_ranges`.
+
+    Returns
+    -------
+    hex_range_min, hex_range_max : int
+        ADC counts at the minimum and maximum of the range.
+    """
+    if _is_unsigned(ai_range_setting):
+        return ai_range_setting["hex_min"], ai_range_setting["hex_max"]
+
+    return (
+        _twos_complement(ai_range_setting["hex_min"]),
+        _twos_complement(ai_range_setting["hex_max"]),
+    )
+
+
+def _units_per_count(ai_range_setting):
+    """Calculate the engineering units per ADC count of an AI range.
+
+    Parameters
+    ----------
+    ai_range_setting : dict
+        AI range parameters, see `xet7019z.ai_ranges`.
+
+    Returns
+    -------
+    units_per_count : float
+        Engineering units per ADC count.
+    """
+    ai_range = ai_range_setting["max"] - ai_range_setting["min"]
+
+    hex_range_min, hex_range_max = _hex_limits(ai_range_setting)
+    hex_range = hex_range_max - hex_range_min
+
+    return ai_range / hex_range
+
+
+def _offset(ai_range_setting):
+    """Calculate the engineering units at an ADC count of zero of an AI range.
+
+    Signed ranges are centred on zero counts so have no offset. Unsigned ranges
+    start at the range minimum, e.g. 4 mA at 0x0000 for 4-20 mA.
+
+    Parameters
+    ----------
+    ai_range_setting : dict
+        AI range parameters, see `xet7019z.ai_ranges`.
+
+    Returns
+    -------
+    offset : float
+        Engineering units at an ADC count of zero in hex format.
+    """
+    if not _is_unsigned(ai_range_setting):
+        return 0.0
+
+    hex_range_min, _ = _hex_limits(ai_range_setting)
+
+    return ai_range_setting["min"] - hex_range_min * _units_per_count(ai_range_setting)
+
+
+class Identity(
+    collections.namedtuple(
+        "Identity",
+        ["manufacturer", "model", "os_version", "fw_version", "io_version"],
+    )
+):
+    """Instrument identity."""
+
+    __slots__ = ()
+
+    def __str__(self):
+        """Format as a comma-separated identification string."""
+        return ", ".join(self)
+
 
 class xet7019z:
     """ICP DAS PET-7019Z/ET-7019Z analog input DAQ instrument.
@@ -18,11 +149,21 @@ class xet7019z:
     Communication is via Modbus.
     """
 
+    # number of analog input channels
+    ai_channels = 10
+
+    # Each AI range has the engineering unit limits of the range, the hex format
+    # values at those limits and, for the engineering unit data format, the
+    # engineering units per count, e.g. 1e-4 V for ranges reported as +/-n.nnnn V.
+    # The engineering units per count must put full scale within a signed 16 bit
+    # register, e.g. 1e-3 V for +/-5 V. Hex format counts are two's complement
+    # except for ranges marked "unsigned", whose counts span 0x0000 to 0xFFFF.
     ai_ranges = {
         0: {
             "min": -15e-3,
             "max": 15e-3,
             "unit": "V",
+            "eng_scale": 1e-6,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -30,6 +171,7 @@ class xet7019z:
             "min": -50e-3,
             "max": 50e-3,
             "unit": "V",
+            "eng_scale": 1e-5,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -37,6 +179,7 @@ class xet7019z:
             "min": -100e-3,
             "max": 100e-3,
             "unit": "V",
+            "eng_scale": 1e-5,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -44,15 +187,31 @@ class xet7019z:
             "min": -500e-3,
             "max": 500e-3,
             "unit": "V",
+            "eng_scale": 1e-4,
+            "hex_max": 0x7FFF,
+            "hex_min": 0x8000,
+        },
+        4: {
+            "min": -1,
+            "max": 1,
+            "unit": "V",
+            "eng_scale": 1e-4,
+            "hex_max": 0x7FFF,
+            "hex_min": 0x8000,
+        },
+        5: {
+            "min": -2.5,
+            "max": 2.5,
+            "unit": "V",
+            "eng_scale": 1e-4,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
-        4: {"min": -1, "max": 1, "unit": "V", "hex_max": 0x7FFF, "hex_min": 0x8000},
-        5: {"min": -2.5, "max": 2.5, "unit": "V", "hex_max": 0x7FFF, "hex_min": 0x8000},
         6: {
             "min": -20e-3,
             "max": 20e-3,
             "unit": "A",
+            "eng_scale": 1e-6,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -60,13 +219,16 @@ class xet7019z:
             "min": 4e-3,
             "max": 20e-3,
             "unit": "A",
+            "eng_scale": 1e-6,
             "hex_max": 0xFFFF,
             "hex_min": 0x0000,
+            "unsigned": True,
         },
         8: {
             "min": -10.0,
             "max": 10.0,
             "unit": "V",
+            "eng_scale": 1e-3,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -74,6 +236,7 @@ class xet7019z:
             "min": -5.0,
             "max": 5.0,
             "unit": "V",
+            "eng_scale": 1e-3,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -81,6 +244,7 @@ class xet7019z:
             "min": -1.0,
             "max": 1.0,
             "unit": "V",
+            "eng_scale": 1e-4,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -88,6 +252,7 @@ class xet7019z:
             "min": -0.5,
             "max": 0.5,
             "unit": "V",
+            "eng_scale": 1e-4,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -95,6 +260,7 @@ class xet7019z:
             "min": -0.15,
             "max": 0.15,
             "unit": "V",
+            "eng_scale": 1e-5,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -102,6 +268,7 @@ class xet7019z:
             "min": -0.02,
             "max": 0.02,
             "unit": "A",
+            "eng_scale": 1e-6,
             "hex_max": 0x7FFF,
             "hex_min": 0x8000,
         },
@@ -109,6 +276,7 @@ class xet7019z:
             "min": -210,
             "max": 760,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xDCA2,
         },
@@ -116,6 +284,7 @@ class xet7019z:
             "min": -270,
             "max": 1372,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xE6D0,
         },
@@ -123,6 +292,7 @@ class xet7019z:
             "min": -270,
             "max": 400,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xA99A,
         },
@@ -130,6 +300,7 @@ class xet7019z:
             "min": -270,
             "max": 1000,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xDD71,
         },
@@ -137,6 +308,7 @@ class xet7019z:
             "min": 0,
             "max": 1768,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0x0000,
         },
@@ -144,6 +316,7 @@ class xet7019z:
             "min": 0,
             "max": 1768,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0x0000,
         },
@@ -151,6 +324,7 @@ class xet7019z:
             "min": 0,
             "max": 1820,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0x0000,
         },
@@ -158,6 +332,7 @@ class xet7019z:
             "min": -270,
             "max": 1300,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xE56B,
         },
@@ -165,6 +340,7 @@ class xet7019z:
             "min": 0,
             "max": 2320,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0x0000,
         },
@@ -172,6 +348,7 @@ class xet7019z:
             "min": -200,
             "max": 800,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x7FFF,
             "hex_min": 0xE000,
         },
@@ -179,6 +356,7 @@ class xet7019z:
             "min": -200,
             "max": 100,
             "unit": "degC",
+            "eng_scale": 0.1,
             "hex_max": 0x4000,
             "hex_min": 0x8000,
         },
@@ -186,12 +364,37 @@ class xet7019z:
             "min": -200,
             "max": 900,
             "unit": "degC",
-            "hex_max": 0xFFFF,
+            "eng_scale": 0.1,
+            "hex_max": 0x7FFF,
             "hex_min": 0xE38E,
         },
-        26: {"min": 0, "max": 20e-3, "unit": "A", "hex_min": 0xFFFF, "hex_max": 0x0000},
+        26: {
+            "min": 0,
+            "max": 20e-3,
+            "unit": "A",
+            "eng_scale": 1e-6,
+            "hex_max": 0xFFFF,
+            "hex_min": 0x0000,
+            "unsigned": True,
+        },
     }
 
+    # engineering units per ADC count in hex format, indexed by AI range setting
+    ai_units_per_count = np.array(list(map(_units_per_count, ai_ranges.values())))
+
+    # engineering units at an ADC count of zero in hex format, indexed by AI range
+    # setting
+    ai_offsets = np.array(list(map(_offset, ai_ranges.values())))
+
+    # whether ADC counts in hex format are unsigned, indexed by AI range setting
+    ai_unsigned = np.array(list(map(_is_unsigned, ai_ranges.values())))
+
+    # engineering units per count in engineering unit format, indexed by AI range
+    # setting
+    ai_eng_units_per_count = np.array(
+        [setting["eng_scale"] for setting in ai_ranges.values()]
+    )
+
     def __enter__(self):
         """Enter the runtime context related to this object."""
         return self
@@ -203,11 +406,50 @@ class xet7019z:
         """
         self.disconnect()
 
-    def __init__(self):
-        """Construct object."""
-        self.instr = pyModbusTCP.client.ModbusClient()
+    def __init__(self, ai_range_verify_interval=None, client=None):
+        """Construct object.
 
-    def connect(self, host, port=502, timeout=30, reset=True):
+        Parameters
+        ----------
+        ai_range_verify_interval : float, optional
+            AI range settings are cached client-side to avoid querying them for every
+            measurement. If not `None`, the cache is re-read from the instrument when
+            it is older than this many seconds, e.g. to pick up changes made by
+            another client.
+        client : object, optional
+            Modbus TCP client with the same interface as
+            `pyModbusTCP.client.ModbusClient`, e.g. a `connection.ResilientClient`
+            to reconnect automatically or a `transport.ModbusTransport` for less
+            overhead per request. Defaults to a pyModbusTCP client.
+        """
+        if client is None:
+            client = pyModbusTCP.client.ModbusClient()
+        self.instr = client
+
+        self.ai_range_verify_interval = ai_range_verify_interval
+        self._ai_range_cache = {}
+        self._ai_range_cache_time = None
+        self._ai_range_connections = None
+
+        self._metrics = None
+
+        self._identity = None
+        self._identity_connections = None
+
+        # AI data format set on the instrument, which determines how AI register
+        # values are converted to engineering units
+        self.data_format = "hex"
+
+    def connect(
+        self,
+        host,
+        port=502,
+        timeout=None,
+        reset=True,
+        warm_start=False,
+        config=None,
+        data_format="hex",
+    ):
         """Connect to the instrument.
 
         Parameters
@@ -216,12 +458,29 @@ class xet7019z:
             Instrument host.
         port : int
             Instrument port. Default for Modbus is 502.
-        timeout : float
-            Comms timeout in seconds.
+        timeout : float, optional
+            Comms timeout in seconds. If `None`, the timeout already set on the client
+            is kept, e.g. 30 s for the default client or the connect timeout of a
+            `ResilientClient`.
         reset : bool, optional
-            Reset the instrument to the built-in default configuration.
+            Reset the instrument to the built-in default configuration. Ignored for a
+            warm start.
+        warm_start : bool, optional
+            Instead of resetting, read the instrument fingerprint (see `fingerprint`)
+            and only write the settings that differ from `config`. If nothing
+            differs, nothing is written.
+        config : dict, optional
+            Desired configuration for a warm start, e.g. a fingerprint or
+            configuration snapshot saved with `save_config`. If it contains an "id"
+            that doesn't match the instrument, the instrument is reset before
+            applying the configuration. If `None`, the current configuration is
+            kept.
+        data_format : str, optional
+            AI data format to use, hexadecimal ("hex") or engineering unit ("eng").
+            Measurements are converted to engineering units correctly in either
+            format.
         """
-        if self.instr.is_open():
+        if self.instr.is_open:
             warnings.warn(
                 "A connection is already open. It will be closed before the new connection is established."
             )
@@ -229,20 +488,75 @@ class xet7019z:
 
         self.instr.host = host
         self.instr.port = port
-        self.instr.timeout = timeout
+        if timeout is not None:
+            self.instr.timeout = timeout
         self.instr.open()
 
+        # cached settings may belong to a different instrument
+        self.invalidate_ai_ranges()
+        self._identity = None
+
+        if warm_start is True:
+            self._warm_start(config, data_format)
+            return
+
         if reset is True:
             self.reset()
 
-        # measure method assumes hex format
-        self.set_ai_data_format("hex")
+        self.set_ai_data_format(data_format)
+
+    def _warm_start(self, config, data_format):
+        """Bring the instrument to a desired configuration without a reset.
+
+        Parameters
+        ----------
+        config : dict or None
+            Desired configuration. See `connect`.
+        data_format : str
+            AI data format to use.
+        """
+        current = self.fingerprint()
+
+        desired = dict(config) if config is not None else {}
+        desired["data_format"] = data_format
+
+        expected_id = desired.pop("id", None)
+        if (expected_id is not None) and (expected_id != current["id"]):
+            warnings.warn(
+                f"Instrument identity '{current['id']}' doesn't match the expected "
+                + f"identity '{expected_id}'. It will be reset."
+            )
+            self.reset()
+            self.apply_config(**desired)
+            return
+
+        changes = {
+            key: value for key, value in desired.items() if current.get(key) != value
+        }
+        if changes:
+            self.apply_config(**changes)
+
+    def fingerprint(self):
+        """Get the instrument identity and complete I/O configuration.
+
+        Returns
+        -------
+        fingerprint : dict
+            Configuration snapshot as returned by `get_config` plus the identity
+            string as returned by `get_id` under the "id" key.
+        """
+        fingerprint = self.get_config()
+        fingerprint["id"] = self.get_id()
+
+        return fingerprint
 
     def disconnect(self):
         """Disconnect the instrument."""
-        if self.instr.is_open():
+        if self.instr.is_open:
             self.instr.close()
 
+        self._identity = None
+
     def get_id(self):
         """Get instrument identity string.
 
@@ -252,48 +566,97 @@ class xet7019z:
             Identification string formatted as: '[manufacturer], [model], [os version],
             [firmware version], [I/O version]'.
         """
-        model = hex(self.instr.read_holding_registers(559, 1)[0])[2:]
-
-        os_version = hex(self.instr.read_input_registers(350, 1)[0])[2:]
-        os_version_fmt = ""
-        for i, n in enumerate(os_version):
-            os_version_fmt += f"{n}"
-            if i != len(os_version) - 1:
-                os_version_fmt += "."
-
-        fw_version = hex(self.instr.read_input_registers(351, 1)[0])[2:]
-        fw_version_fmt = ""
-        for i, n in enumerate(fw_version):
-            fw_version_fmt += f"{i}"
-            if i != len(fw_version) - 1:
-                fw_version_fmt += "."
-
-        io_version = hex(self.instr.read_input_registers(353, 1)[0])[2:]
-        io_version_fmt = ""
-        for i, n in enumerate(io_version):
-            io_version_fmt += f"{i}"
-            if i != len(io_version) - 1:
-                io_version_fmt += "."
-
-        id_str = (
-            f"ICP DAS, {model}, {os_version_fmt}, {fw_version_fmt}, {io_version_fmt}"
-        )
+        return str(self.get_identity())
+
+    def get_identity(self):
+        """Get instrument identity.
+
+        The identity is read with the fewest requests, see `read_fields`, then cached
+        until the connection is re-established. That's three requests: the model
+        holding register, input registers 350 and 351, and input register 353, as
+        352 isn't in the published register table so isn't read across.
+
+        Returns
+        -------
+        identity : Identity
+            Manufacturer, model, OS version, firmware version and I/O version.
+        """
+        connections = getattr(self.instr, "connections", None)
+        if (self._identity is None) or (self._identity_connections != connections):
+            values = self.read_fields(
+                ["model", "os_version", "fw_version", "io_version"]
+            )
+
+            self._identity = Identity(
+                "ICP DAS",
+                values["model"],
+                values["os_version"],
+                values["fw_version"],
+                values["io_version"],
+            )
+            self._identity_connections = connections
+
+        return self._identity
 
-        return id_str
+    def enable_metrics(self):
+        """Start collecting Modbus transaction and method latency metrics.
+
+        Metrics add a small overhead to every call while they are enabled and none
+        while they are disabled.
+        """
+        if self._metrics is None:
+            self._metrics = metrics.Metrics()
+            metrics.instrument(
+                self,
+                self._metrics,
+                exclude=("enable_metrics", "disable_metrics", "stats", "reset_stats"),
+            )
+
+    def disable_metrics(self):
+        """Stop collecting metrics and discard them."""
+        if self._metrics is not None:
+            metrics.uninstrument(self)
+            self._metrics = None
+
+    def stats(self):
+        """Get a snapshot of the collected metrics.
+
+        Returns
+        -------
+        stats : dict
+            Transaction counts per function code and register, bytes sent and
+            received, error and timeout counts, and latency histograms per function
+            code and method. See `metrics.Metrics.snapshot`.
+        """
+        if self._metrics is None:
+            raise RuntimeError("Metrics are not enabled. Call enable_metrics() first.")
+
+        return self._metrics.snapshot()
+
+    def reset_stats(self):
+        """Clear the collected metrics."""
+        if self._metrics is None:
+            raise RuntimeError("Metrics are not enabled. Call enable_metrics() first.")
+
+        self._metrics.reset()
 
     def reset(self):
         """Reset the instrument to the factory default configuration.
 
         This method only affects I/O settings, preserving calibration settings.
         """
-        self.instr.write_single_coil(226, True)
+        self.instr.write_single_coil(REGISTER_MAP["reset"].address, True)
+
+        # ranges have reverted to defaults so re-read them when next needed
+        self.invalidate_ai_ranges()
 
-    def _adc_to_eng(self, channel, value):
+    def _adc_to_eng(self, channel, value, ai_range=None):
         """Normalise a returned ADC value.
 
         pyModbusTCP returns the two's complement of the internal ADC value when
         queried, irrespective of whether the instrument is in hex or engineering mode.
-        This method converts the returned value to engineering units.
+        This method converts the returned value to engineering units, using the
+        scale of the current data format.
 
         Parameters
         ---------
@@ -301,30 +664,19 @@ class xet7019z:
             Channel to set, 0-indexed.
         value : int
             Returned integer to normalise.
+        ai_range : int, optional
+            AI range setting of the channel. If `None`, it is queried from the
+            instrument.
 
         Returns
         -------
         eng : float
             Value in engineering units.
         """
-        value = self._twos_complement(value)
-
-        # get range setting params
-        ai_range_setting = self.ai_ranges[self.get_ai_range(channel)]
-        ai_range_min = ai_range_setting["min"]
-        ai_range_max = ai_range_setting["max"]
-        ai_range = ai_range_max - ai_range_min
-
-        hex_range_min = self._twos_complement(ai_range_setting["hex_min"])
-        hex_range_max = self._twos_complement(ai_range_setting["hex_max"])
-        hex_range = hex_range_max - hex_range_min
+        if ai_range is None:
+            ai_range = self._cached_ai_range(channel)
 
-        # eng units per adc count
-        units_per_count = ai_range / hex_range
-
-        eng = value * units_per_count
-
-        return eng
+        return _count_to_eng(value, ai_range, self.data_format)
 
     def _twos_complement(self, value):
         """Calculate decimal value from signed 2's complement.
@@ -339,11 +691,7 @@ class xet7019z:
         value : int
             Signed decimal value derived from hex 2's complement.
         """
-        # rescale the value from -32768 to 32767 (16 bit)
-        if (value & (1 << (16 - 1))) != 0:
-            value -= 1 << 16
-
-        return value
+        return _twos_complement(value)
 
     def _eng_to_adc(self, channel, eng):
         """Convert a number to an ADC value expected by the instrument.
@@ -358,20 +706,10 @@ class xet7019z:
         value : int
             ADC value.
         """
-        # get range setting params
-        ai_range_setting = self.ai_ranges[self.get_ai_range(channel)]
-        ai_range_min = ai_range_setting["min"]
-        ai_range_max = ai_range_setting["max"]
-        ai_range = ai_range_max - ai_range_min
+        units_per_count, offsets, _ = _scale_table(self.data_format)
+        ai_range = self._cached_ai_range(channel)
 
-        hex_range_min = self._twos_complement(ai_range_setting["hex_min"])
-        hex_range_max = self._twos_complement(ai_range_setting["hex_max"])
-        hex_range = hex_range_max - hex_range_min
-
-        # eng units per adc count
-        units_per_count = ai_range / hex_range
-
-        value = eng / units_per_count
+        value = (eng - float(offsets[ai_range])) / float(units_per_count[ai_range])
 
         # re-scale from 0 to 65535 using two's complement
         if value < 0:
@@ -416,7 +754,10 @@ class xet7019z:
                 25: Type L DIN43710
                 26: 0-20 mA
         """
-        self.instr.write_single_register(427 + channel, ai_range)
+        self.instr.write_single_register(
+            REGISTER_MAP["ai_ranges"].address + channel, ai_range
+        )
+        self._ai_range_cache[channel] = ai_range
 
     def get_ai_range(self, channel):
         """Get an AI range.
@@ -458,7 +799,81 @@ class xet7019z:
                 25: Type L DIN43710
                 26: 0-20 mA
         """
-        return self.instr.read_holding_registers(427 + channel, 1)[0]
+        ai_range = self.instr.read_holding_registers(
+            REGISTER_MAP["ai_ranges"].address + channel, 1
+        )[0]
+        self._ai_range_cache[channel] = ai_range
+
+        return ai_range
+
+    def refresh_ai_ranges(self):
+        """Read the AI ranges of all channels into the range cache.
+
+        All range registers are read in a single Modbus request.
+
+        Returns
+        -------
+        ai_ranges : list of int
+            Range setting integers of all channels. See `get_ai_range`.
+        """
+        ai_ranges = self.read_fields(["ai_ranges"])["ai_ranges"]
+        self._fill_ai_range_cache(ai_ranges)
+
+        return list(ai_ranges)
+
+    def _fill_ai_range_cache(self, ai_ranges):
+        """Replace the range cache with the AI ranges of all channels.
+
+        Parameters
+        ----------
+        ai_ranges : list of int
+            Range setting integers of all channels, as read from the instrument.
+        """
+        self._ai_range_cache = dict(enumerate(ai_ranges))
+        self._ai_range_cache_time = time.monotonic()
+        self._ai_range_connections = getattr(self.instr, "connections", None)
+
+    def invalidate_ai_ranges(self):
+        """Clear the AI range cache.
+
+        The ranges are re-read from the instrument the next time they are needed.
+        """
+        self._ai_range_cache = {}
+        self._ai_range_cache_time = None
+
+    def _cached_ai_range(self, channel):
+        """Get an AI range from the range cache.
+
+        The cache is refreshed in bulk if the channel is missing, if the client has
+        reconnected since it was filled (see `connection.ResilientClient`) or, in
+        verify mode, if the cache has expired. A reconnect may be to an instrument
+        that was reset or replaced while the connection was down, so its ranges are
+        re-read like its identity, see `get_identity`.
+
+        Parameters
+        ---------
+        channel : int
+            Channel to get, 0-indexed.
+
+        Returns
+        -------
+        ai_range : int
+            Range setting integer. See `get_ai_range`.
+        """
+        if getattr(self.instr, "connections", None) != self._ai_range_connections:
+            self.refresh_ai_ranges()
+        elif (self.ai_range_verify_interval is not None) and (
+            (self._ai_range_cache_time is None)
+            or (
+                time.monotonic() - self._ai_range_cache_time
+                > self.ai_range_verify_interval
+            )
+        ):
+            self.refresh_ai_ranges()
+        elif channel not in self._ai_range_cache:
+            self.refresh_ai_ranges()
+
+        return self._ai_range_cache[channel]
 
     def measure(self, channel):
         """Get measurement value for a channel.
@@ -473,10 +888,84 @@ class xet7019z:
         eng : float
             Value in engineering units.
         """
-        value = self.instr.read_input_registers(channel, 1)[0]
+        value = self.instr.read_input_registers(
+            REGISTER_MAP["ai"].address + channel, 1
+        )[0]
 
         return self._adc_to_eng(channel, value)
 
+    def measure_all(self, channels=None):
+        """Get measurement values for several channels in a single scan.
+
+        The input registers of all requested channels are read in one Modbus request.
+        AI range settings are taken from the range cache.
+
+        Parameters
+        ----------
+        channels : list of int, optional
+            Channels to measure, 0-indexed. If `None`, all channels are measured.
+
+        Returns
+        -------
+        timestamp : float
+            Time at which the scan was requested, in seconds since the epoch.
+        values : list of float
+            Values in engineering units, in the same order as `channels`.
+        """
+        timestamp, counts, ai_ranges = self.measure_raw(channels)
+
+        return timestamp, adc_to_eng(counts, ai_ranges, self.data_format).tolist()
+
+    def measure_raw(self, channels=None):
+        """Get raw ADC counts for several channels in a single scan.
+
+        The input registers of all requested channels are read in one Modbus request.
+        No conversion to engineering units is done, so this is suited to high-rate
+        acquisition with conversion deferred to `adc_to_eng`, which also needs the
+        `data_format` the counts were acquired in.
+
+        Parameters
+        ----------
+        channels : list of int, optional
+            Channels to measure, 0-indexed. If `None`, all channels are measured.
+
+        Returns
+        -------
+        timestamp : float
+            Time at which the scan was requested, in seconds since the epoch.
+        counts : numpy.ndarray of int16
+            ADC counts, in the same order as `channels`. Counts of ranges with
+            unsigned hex format counts, e.g. 4-20 mA, hold the same 16 bits, which
+            `adc_to_eng` decodes.
+        ai_ranges : numpy.ndarray of int
+            AI range setting integers in effect for `counts`, taken from the range
+            cache.
+        """
+        if channels is None:
+            channels = range(self.ai_channels)
+
+        # read the smallest contiguous block covering all requested channels
+        first = min(channels)
+        count = max(channels) - first + 1
+        address = REGISTER_MAP["ai"].address + first
+
+        timestamp = time.time()
+        read_view = getattr(self.instr, "read_input_registers_view", None)
+        if read_view is not None:
+            # decode straight from the receive buffer, copying only once
+            counts = read_view(address, count)
+        else:
+            values = self.instr.read_input_registers(address, count)
+            counts = np.array(values, dtype=np.uint16).view(np.int16)
+
+        if list(channels) != list(range(first, first + count)):
+            counts = counts[[ch - first for ch in channels]]
+        counts = counts.astype(np.int16)
+
+        ai_ranges = np.array([self._cached_ai_range(ch) for ch in channels])
+
+        return timestamp, counts, ai_ranges
+
     def enable_cjc(self, enable):
         """Enable or disable cold junction compensation.
 
@@ -485,7 +974,7 @@ class xet7019z:
         enable : bool
             Enable (`True`) or disable (`False`) cold junction compensation.
         """
-        self.instr.write_single_coil(627, enable)
+        self.instr.write_single_coil(REGISTER_MAP["cjc"].address, enable)
 
     def set_cjc_offset(self, channel: int, offset: int):
         """Set the cold junction compensation offset for a channel.
@@ -504,7 +993,9 @@ class xet7019z:
         if offset < 0:
             offset += 1 << 16
 
-        self.instr.write_single_register(491 + channel, offset)
+        self.instr.write_single_register(
+            REGISTER_MAP["cjc_offsets"].address + channel, offset
+        )
 
     def get_cjc_offset(self, channel):
         """Get the cold junction compensation offset for a channel.
@@ -519,7 +1010,9 @@ class xet7019z:
         offset : float
             Cold junction compensation offset in ADC counts (-9999 to 9999).
         """
-        offset = self.instr.read_holding_registers(491 + channel, 1)[0]
+        offset = self.instr.read_holding_registers(
+            REGISTER_MAP["cjc_offsets"].address + channel, 1
+        )[0]
 
         # re-scale from -9999 to 9999
         offset = self._twos_complement(offset)
@@ -536,7 +1029,9 @@ class xet7019z:
         enable : bool
             Enable (`True`) or disable (`False`) cold junction compensation.
         """
-        self.instr.write_single_coil(595 + channel, enable)
+        self.instr.write_single_coil(
+            REGISTER_MAP["ai_enabled"].address + channel, enable
+        )
 
     def set_ai_noise_filter(self, plf):
         """Set analog input noise filter frequency.
@@ -553,7 +1048,7 @@ class xet7019z:
         else:
             raise ValueError(f"Invalid power line frequency: {plf}. Must be 50 or 60.")
 
-        self.instr.write_single_coil(629, cmd)
+        self.instr.write_single_coil(REGISTER_MAP["plf"].address, cmd)
 
     def set_ai_data_format(self, data_format):
         """Set analog input data format.
@@ -572,7 +1067,374 @@ class xet7019z:
                 f"Invalid AI data format: {data_format}. Must be 'hex' or 'eng'."
             )
 
-        self.instr.write_single_coil(631, cmd)
+        self.instr.write_single_coil(REGISTER_MAP["data_format"].address, cmd)
+        self.data_format = data_format
+
+    def get_config(self):
+        """Get the complete I/O configuration of the instrument.
+
+        The settings are read with the fewest Modbus requests, see `read_fields`, which
+        are pipelined if the client supports it.
+
+        Returns
+        -------
+        config : dict
+            Configuration snapshot with keys "ranges", "cjc_offsets" and "enabled"
+            holding lists indexed by channel, plus "cjc", "plf" and "data_format".
+            It can be passed to `restore_config` or `apply_config`.
+        """
+        return self._config_snapshot(self.read_fields(CONFIG_FIELDS))
+
+    def restore_config(self, config):
+        """Restore a configuration snapshot.
+
+        Only the settings that differ from the current configuration are written, in
+        bulk. See `apply_config`.
+
+        Parameters
+        ----------
+        config : dict
+            Configuration snapshot as returned by `get_config`, `fingerprint` or
+            `load_config`. Any "id" is ignored.
+        """
+        config = dict(config)
+        config.pop("id", None)
+
+        self.apply_config(**config)
+
+    def apply_config(
+        self,
+        ranges=None,
+        enabled=None,
+        cjc_offsets=None,
+        plf=None,
+        cjc=None,
+        data_format=None,
+    ):
+        """Apply a channel configuration, writing only the settings that differ.
+
+        The current values of the requested settings are read first with the fewest
+        requests, see `read_fields`. Changed AI ranges, CJC offsets and AI enable
+        states are then written with one multiple-register or multiple-coil request
+        per block, covering only the span of channels that changed. With a pipelining
+        `transport.ModbusTransport` the reads, and then the writes, are each sent back
+        to back.
+
+        Parameters
+        ----------
+        ranges : dict or list of int, optional
+            AI range setting integers keyed by channel, or a list indexed by channel.
+            See `set_ai_range`.
+        enabled : dict or list of bool, optional
+            AI enable states keyed by channel, or a list indexed by channel.
+        cjc_offsets : dict or list of int, optional
+            Cold junction compensation offsets in ADC counts (-9999 to 9999) keyed by
+            channel, or a list indexed by channel.
+        plf : int, {50, 60}, optional
+            Power line frequency in Hz for the noise filter.
+        cjc : bool, optional
+            Enable (`True`) or disable (`False`) cold junction compensation.
+        data_format : str, optional
+            Hexadecimal ("hex") or engineering unit ("eng") format.
+        """
+        request = self._config_request(
+            ranges, enabled, cjc_offsets, plf, cjc, data_format
+        )
+        current = self.read_fields(list(request))
+        writes, ai_ranges = self._plan_config(request, current)
+
+        self._batch(writes)
+
+        if ai_ranges is not None:
+            self._fill_ai_range_cache(ai_ranges)
+
+        if data_format is not None:
+            self.data_format = data_format
+
+    def _config_snapshot(self, values):
+        """Make a configuration snapshot from the configuration fields.
+
+        The range cache and data format are updated from the fields too.
+
+        Parameters
+        ----------
+        values : dict
+            Decoded values of `CONFIG_FIELDS`, see `read_fields`.
+
+        Returns
+        -------
+        config : dict
+            Configuration snapshot, see `get_config`.
+        """
+        self._fill_ai_range_cache(values["ai_ranges"])
+        self.data_format = values["data_format"]
+
+        return {
+            "ranges": values["ai_ranges"],
+            "cjc_offsets": values["cjc_offsets"],
+            "enabled": values["ai_enabled"],
+            "cjc": values["cjc"],
+            "plf": values["plf"],
+            "data_format": values["data_format"],
+        }
+
+    def _config_request(self, ranges, enabled, cjc_offsets, plf, cjc, data_format):
+        """Validate a channel configuration and convert it to register values.
+
+        Parameters
+        ----------
+        ranges, enabled, cjc_offsets, plf, cjc, data_format
+            See `apply_config`. `None` leaves a setting unchanged.
+
+        Returns
+        -------
+        request : dict
+            Requested settings keyed by the name of the field that holds them. Per
+            channel settings are dicts of register or coil values keyed by channel.
+            Global settings are (setting, coil value) tuples.
+        """
+        request = {}
+
+        if ranges is not None:
+            ranges = self._channel_dict(ranges)
+            for ai_range in ranges.values():
+                if ai_range not in self.ai_ranges:
+                    raise ValueError(f"Invalid AI range: {ai_range}.")
+            request["ai_ranges"] = ranges
+
+        if cjc_offsets is not None:
+            cjc_offsets = self._channel_dict(cjc_offsets)
+            for channel, offset in cjc_offsets.items():
+                if (offset > 9999) or (offset < -9999):
+                    raise ValueError(
+                        f"Invalid offset: {offset}. Must be >= -9999 and =< 9999."
+                    )
+
+                # re-scale from 0 to 65535 using two's complement
+                if offset < 0:
+                    cjc_offsets[channel] = offset + (1 << 16)
+            request["cjc_offsets"] = cjc_offsets
+
+        if enabled is not None:
+            request["ai_enabled"] = {
+                channel: bool(enable)
+                for channel, enable in self._channel_dict(enabled).items()
+            }
+
+        if cjc is not None:
+            request["cjc"] = (bool(cjc), bool(cjc))
+        if plf is not None:
+            if plf not in (50, 60):
+                raise ValueError(
+                    f"Invalid power line frequency: {plf}. Must be 50 or 60."
+                )
+            request["plf"] = (plf, plf == 50)
+        if data_format is not None:
+            if data_format not in ("hex", "eng"):
+                raise ValueError(
+                    f"Invalid AI data format: {data_format}. Must be 'hex' or 'eng'."
+                )
+            request["data_format"] = (data_format, data_format == "eng")
+
+        return request
+
+    def _plan_config(self, request, current):
+        """Plan the writes that apply a channel configuration.
+
+        Parameters
+        ----------
+        request : dict
+            Requested settings, see `_config_request`.
+        current : dict
+            Current values of the fields in `request`, see `read_fields`.
+
+        Returns
+        -------
+        writes : list of tuple
+            Write requests, see `_batch`.
+        ai_ranges : list of int or None
+            AI range settings of all channels after writing, or `None` if no ranges
+            were requested.
+        """
+        writes = []
+        ai_ranges = None
+
+        for name, requested in request.items():
+            address = REGISTER_MAP[name].address
+            if name == "ai_ranges":
+                ai_ranges = self._plan_register_write(
+                    address, current[name], requested, writes
+                )
+            elif name == "cjc_offsets":
+                self._plan_register_write(
+                    address,
+                    [offset & 0xFFFF for offset in current[name]],
+                    requested,
+                    writes,
+                )
+            elif name == "ai_enabled":
+                self._plan_coil_write(address, current[name], requested, writes)
+            else:
+                value, coil = requested
+                if current[name] != value:
+                    writes.append(("write_single_coil", address, coil))
+
+        return writes, ai_ranges
+
+    def _channel_dict(self, values):
+        """Convert per-channel settings to a dict keyed by channel.
+
+        Parameters
+        ----------
+        values : dict or list
+            Settings keyed by channel, or a list indexed by channel.
+
+        Returns
+        -------
+        values : dict
+            Settings keyed by channel.
+        """
+        if isinstance(values, dict):
+            values = dict(values)
+        else:
+            values = dict(enumerate(values))
+
+        for channel in values:
+            if channel not in range(self.ai_channels):
+                raise ValueError(f"Invalid channel: {channel}.")
+
+        return values
+
+    def _changed_span(self, current, requested):
+        """Merge requested values into a block and find the span that changed.
+
+        Parameters
+        ----------
+        current : list
+            Current values of the block.
+        requested : dict
+            Requested values keyed by offset into the block.
+
+        Returns
+        -------
+        new : list
+            Values of the block after applying the requested values.
+        span : tuple of int or None
+            First and last offset of the changed values, or `None` if nothing
+            changed.
+        """
+        new = list(current)
+        for offset, value in requested.items():
+            new[offset] = value
+
+        changed = [i for i, (a, b) in enumerate(zip(current, new)) if a != b]
+        if not changed:
+            return new, None
+
+        return new, (changed[0], changed[-1])
+
+    def _plan_register_write(self, address, current, requested, writes):
+        """Plan a write of the changed span of a holding register block.
+
+        Parameters
+        ----------
+        address : int
+            Address of the first register of the block.
+        current : list of int
+            Current register values of the block.
+        requested : dict
+            Requested register values keyed by offset into the block.
+        writes : list of tuple
+            Write requests, see `_batch`. The write is appended if anything changed.
+
+        Returns
+        -------
+        new : list of int
+            Register values of the block after writing.
+        """
+        new, span = self._changed_span(current, requested)
+        if span is not None:
+            first, last = span
+            writes.append(
+                ("write_multiple_registers", address + first, new[first : last + 1])
+            )
+
+        return new
+
+    def _plan_coil_write(self, address, current, requested, writes):
+        """Plan a write of the changed span of a coil block.
+
+        Parameters
+        ----------
+        address : int
+            Address of the first coil of the block.
+        current : list of bool
+            Current coil values of the block.
+        requested : dict
+            Requested coil values keyed by offset into the block.
+        writes : list of tuple
+            Write requests, see `_batch`. The write is appended if anything changed.
+
+        Returns
+        -------
+        new : list of bool
+            Coil values of the block after writing.
+        """
+        new, span = self._changed_span(current, requested)
+        if span is not None:
+            first, last = span
+            if first == last:
+                writes.append(("write_single_coil", address + first, new[first]))
+            else:
+                writes.append(
+                    ("write_multiple_coils", address + first, new[first : last + 1])
+                )
+
+        return new
+
+    def read_fields(self, names):
+        """Read several fields of the register map with the fewest Modbus requests.
+
+        Adjoining fields in the same Modbus table are read together when the request
+        stays within the protocol limits, see `registers.plan_reads`.
+
+        Parameters
+        ----------
+        names : list of str
+            Names of fields in `registers.REGISTER_MAP`.
+
+        Returns
+        -------
+        values : dict
+            Decoded values keyed by field name.
+        """
+        return read_fields(self._batch, names)
+
+    def _batch(self, requests):
+        """Make several independent requests.
+
+        With a client that can pipeline requests, e.g. `transport.ModbusTransport`,
+        the requests are pipelined, see `transport.ModbusTransport.pipeline`. Other
+        clients make them one at a time.
+
+        Parameters
+        ----------
+        requests : list of tuple
+            Requests as (client method name, address, count or value(s)) tuples.
+
+        Returns
+        -------
+        results : list
+            Result of each request, in the same order as `requests`.
+        """
+        pipeline = getattr(self.instr, "pipeline", None)
+        if pipeline is not None:
+            return pipeline(requests)
+
+        return [
+            getattr(self.instr, name)(address, value)
+            for name, address, value in requests
+        ]
 
     def enable_calibration(self, enable):
         """Enable/disable AI calibration mode.
@@ -582,12 +1444,139 @@ class xet7019z:
         enable : bool
             Enable (`True`) or disable (`False`) AI calibration mode.
         """
-        self.instr.write_single_coil(830, enable)
+        self.instr.write_single_coil(REGISTER_MAP["calibration"].address, enable)
 
     def zero_calibration(self):
         """Record the 0 V or 0 mA calibration value."""
-        self.instr.write_single_coil(831, True)
+        self.instr.write_single_coil(REGISTER_MAP["calibration_trigger"].address, True)
 
     def span_calibration(self):
         """Record the span (positive full range) calibration value."""
-        self.instr.write_single_coil(831, True)
+        self.instr.write_single_coil(REGISTER_MAP["calibration_trigger"].address, True)
+
+
+def _scale_table(data_format):
+    """Get the scale of the ADC counts of all AI ranges for a data format.
+
+    Parameters
+    ----------
+    data_format : str
+        Hexadecimal ("hex") or engineering unit ("eng") format.
+
+    Returns
+    -------
+    units_per_count : numpy.ndarray of float64
+        Engineering units per count, indexed by AI range setting.
+    offsets : numpy.ndarray of float64
+        Engineering units at a count of zero, indexed by AI range setting.
+    unsigned : numpy.ndarray of bool
+        Whether the counts are unsigned, indexed by AI range setting.
+    """
+    if data_format == "hex":
+        return xet7019z.ai_units_per_count, xet7019z.ai_offsets, xet7019z.ai_unsigned
+    elif data_format == "eng":
+        # engineering unit format counts are signed and centred on zero
+        return (
+            xet7019z.ai_eng_units_per_count,
+            np.zeros(len(xet7019z.ai_ranges)),
+            np.zeros(len(xet7019z.ai_ranges), dtype=bool),
+        )
+    else:
+        raise ValueError(
+            f"Invalid AI data format: {data_format}. Must be 'hex' or 'eng'."
+        )
+
+
+def _count_to_eng(value, ai_range, data_format):
+    """Convert a returned ADC value to engineering units.
+
+    Parameters
+    ----------
+    value : int
+        Register value as returned by the instrument (0 to 65535).
+    ai_range : int
+        AI range setting of the channel.
+    data_format : str
+        AI data format the value was read in, hexadecimal ("hex") or engineering
+        unit ("eng").
+
+    Returns
+    -------
+    eng : float
+        Value in engineering units.
+    """
+    units_per_count, offsets, unsigned = _scale_table(data_format)
+
+    if unsigned[ai_range]:
+        counts = value & 0xFFFF
+    else:
+        counts = _twos_complement(value)
+
+    return float(offsets[ai_range]) + counts * float(units_per_count[ai_range])
+
+
+def adc_to_eng(values, ai_ranges, data_format="hex"):
+    """Convert a block of returned ADC values to engineering units.
+
+    This is the vectorised equivalent of `xet7019z._adc_to_eng`, e.g. for converting
+    stored raw samples in bulk.
+
+    Parameters
+    ----------
+    values : array-like of int
+        Register values as returned by the instrument (0 to 65535) or ADC counts as
+        returned by `xet7019z.measure_raw` (int16). The last axis must match
+        `ai_ranges`.
+    ai_ranges : int or array-like of int
+        AI range setting integer of each column of `values`.
+    data_format : str, optional
+        AI data format the values were read in, hexadecimal ("hex") or engineering
+        unit ("eng").
+
+    Returns
+    -------
+    eng : numpy.ndarray of float64
+        Values in engineering units.
+    """
+    values = np.asarray(values)
+    if values.dtype != np.int16:
+        values = values.astype(np.uint16).view(np.int16)
+
+    ai_ranges = np.asarray(ai_ranges)
+    units_per_count, offsets, unsigned = _scale_table(data_format)
+
+    # reinterpret the counts of unsigned ranges, e.g. 4-20 mA
+    counts = np.where(unsigned[ai_ranges], values.view(np.uint16), values)
+
+    return offsets[ai_ranges] + counts * units_per_count[ai_ranges]
+
+
+def save_config(config, path):
+    """Save a configuration snapshot to a file.
+
+    Parameters
+    ----------
+    config : dict
+        Configuration snapshot as returned by `xet7019z.get_config`.
+    path : str or path-like
+        File path.
+    """
+    with open(path, "w") as f:
+        json.dump(config, f, separators=(",", ":"))
+
+
+def load_config(path):
+    """Load a configuration snapshot from a file.
+
+    Parameters
+    ----------
+    path : str or path-like
+        File path.
+
+    Returns
+    -------
+    config : dict
+        Configuration snapshot that can be passed to `xet7019z.restore_config`.
+    """
+    with open(path, "r") as f:
+        return json.load(f)
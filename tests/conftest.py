@@ -0,0 +1,20 @@
+"""Fixtures shared by the tests."""
+
+import socket
+
+import pytest
+
+from xet7019z.simulator import SimulatedXet7019z
+
+
+def free_port():
+    """Get a free local TCP port."""
+    with socket.socket() as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    with SimulatedXet7019z(port=free_port()) as simulator:
+        yield simulator
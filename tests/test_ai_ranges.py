@@ -0,0 +1,108 @@
+"""Tests of the conversion of ADC counts to engineering units for all AI ranges."""
+
+import numpy as np
+import pytest
+
+from xet7019z import adc_to_eng, xet7019z
+from xet7019z.xet7019z import _count_to_eng, _twos_complement
+
+AI_RANGES = sorted(xet7019z.ai_ranges)
+
+COUNTS = [0x0000, 0x7FFF, 0x8000, 0xFFFF]
+
+UNSIGNED_RANGES = [7, 26]
+
+
+def expected_hex(ai_range, value):
+    """Convert a hex format register value from the range limits alone.
+
+    Signed ranges use the two's complement conversion of the original driver and
+    unsigned ranges span their limits over 0x0000 to 0xFFFF.
+    """
+    setting = xet7019z.ai_ranges[ai_range]
+    span = setting["max"] - setting["min"]
+
+    if ai_range in UNSIGNED_RANGES:
+        return setting["min"] + value * span / 0xFFFF
+
+    hex_span = _twos_complement(setting["hex_max"]) - _twos_complement(
+        setting["hex_min"]
+    )
+
+    return _twos_complement(value) * span / hex_span
+
+
+def test_unsigned_ranges():
+    assert [i for i in AI_RANGES if xet7019z.ai_unsigned[i]] == UNSIGNED_RANGES
+
+
+@pytest.mark.parametrize("ai_range", AI_RANGES)
+@pytest.mark.parametrize("value", COUNTS)
+def test_count_to_eng_hex(ai_range, value):
+    eng = _count_to_eng(value, ai_range, "hex")
+
+    assert eng == pytest.approx(expected_hex(ai_range, value))
+
+
+@pytest.mark.parametrize("ai_range", AI_RANGES)
+@pytest.mark.parametrize("value", COUNTS)
+def test_count_to_eng_eng(ai_range, value):
+    eng = _count_to_eng(value, ai_range, "eng")
+    expected = _twos_complement(value) * xet7019z.ai_ranges[ai_range]["eng_scale"]
+
+    assert eng == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("ai_range", AI_RANGES)
+@pytest.mark.parametrize("data_format", ["hex", "eng"])
+def test_adc_to_eng_matches_count_to_eng(ai_range, data_format):
+    values = np.array(COUNTS, dtype=np.uint16)
+    expected = [_count_to_eng(value, ai_range, data_format) for value in COUNTS]
+
+    # register values and the int16 counts of measure_raw decode the same
+    assert adc_to_eng(values, ai_range, data_format) == pytest.approx(expected)
+    assert adc_to_eng(values.view(np.int16), ai_range, data_format) == pytest.approx(
+        expected
+    )
+
+
+@pytest.mark.parametrize("ai_range", AI_RANGES)
+def test_hex_limits(ai_range):
+    setting = xet7019z.ai_ranges[ai_range]
+
+    # signed ranges are scaled over their whole span from zero counts, so the
+    # limits are only within a count
+    count = xet7019z.ai_units_per_count[ai_range]
+    for key in ["min", "max"]:
+        eng = _count_to_eng(setting[f"hex_{key}"], ai_range, "hex")
+
+        assert eng == pytest.approx(setting[key], abs=count)
+
+
+@pytest.mark.parametrize("ai_range", AI_RANGES)
+def test_eng_full_scale_fits_16_bits(ai_range):
+    setting = xet7019z.ai_ranges[ai_range]
+
+    for key in ["min", "max"]:
+        assert -0x8000 <= round(setting[key] / setting["eng_scale"]) <= 0x7FFF
+
+
+@pytest.mark.parametrize(
+    "ai_range, value, eng",
+    [
+        (7, 0x0000, 4e-3),
+        (7, 0xFFFF, 20e-3),
+        (18, 0x0000, 0),
+        (18, 0xFFFF, -1768 / 0x7FFF),
+        (22, 0xFFFF, -2320 / 0x7FFF),
+        (25, 0x0000, 0),
+        (25, 0x7FFF, 900),
+        (25, 0xE38E, -200),
+        (26, 0x0000, 0),
+        (26, 0xFFFF, 20e-3),
+    ],
+)
+def test_known_values(ai_range, value, eng):
+    count = xet7019z.ai_units_per_count[ai_range]
+
+    assert _count_to_eng(value, ai_range, "hex") == pytest.approx(eng, abs=count)
@@ -0,0 +1,28 @@
+"""Tests of the resilient connection against the simulated instrument."""
+
+import pytest
+
+from xet7019z import xet7019z
+from xet7019z.connection import ResilientClient
+
+
+@pytest.fixture
+def daq(simulator):
+    daq = xet7019z(client=ResilientClient(simulator.host, simulator.port))
+    daq.connect(simulator.host, simulator.port)
+    yield daq
+    daq.disconnect()
+    simulator.reset()
+
+
+def test_reconnect_invalidates_ai_ranges(simulator, daq):
+    simulator.set_signal(0, lambda t: 1.0)
+    assert daq.measure(0) == pytest.approx(1.0, abs=1e-3)
+
+    # the instrument is reconfigured while the connection is down
+    daq.instr.close()
+    simulator.data_bank.set_holding_registers(427, [5])
+
+    assert daq.measure(0) == pytest.approx(1.0, abs=1e-4)
+    assert daq.instr.connections == 2
+    assert daq.get_ai_range(0) == 5
@@ -0,0 +1,41 @@
+"""Tests of concurrent scans of a fleet of simulated instruments."""
+
+import math
+
+import pytest
+
+from conftest import free_port
+from xet7019z import Fleet
+
+
+def test_scan_merges_instruments(simulator):
+    devices = {
+        "localhost": {"port": simulator.port, "channels": {0: 8, 1: 8}},
+        "127.0.0.1": {"port": simulator.port, "channels": {2: 8}},
+        # nothing listens on this port, so the instrument never returns a scan
+        "127.0.0.2": {"port": free_port(), "timeout": 0.5, "channels": {0: 8}},
+    }
+
+    with Fleet(devices) as fleet:
+        fleet.connect()
+        scan = fleet.scan(timeout=5)
+
+    assert list(scan.values) == [
+        ("localhost", 0),
+        ("localhost", 1),
+        ("127.0.0.1", 2),
+        ("127.0.0.2", 0),
+    ]
+    assert all(-10 <= scan.values[key] <= 10 for key in list(scan.values)[:3])
+    assert math.isnan(scan.values[("127.0.0.2", 0)])
+
+    assert 0 <= scan.offsets["localhost"] < 5
+    assert scan.offsets["127.0.0.2"] is None
+
+
+@pytest.mark.parametrize(
+    "devices", [{}, {"localhost": {}}, {"localhost": {"channels": {}}}]
+)
+def test_invalid_devices(devices):
+    with pytest.raises(ValueError):
+        Fleet(devices)
@@ -0,0 +1,43 @@
+"""Tests of the Modbus TCP framing shared by the clients."""
+
+import pytest
+
+from xet7019z import modbus
+
+
+@pytest.mark.parametrize(
+    "function_code, pdu, count, result",
+    [
+        (
+            modbus.READ_COILS,
+            bytes([1, 2, 0b101, 0b1]),
+            9,
+            [True, False, True] + [False] * 5 + [True],
+        ),
+        (modbus.READ_INPUT_REGISTERS, bytes([4, 4, 0, 1, 0xFF, 0xFF]), 2, [1, 0xFFFF]),
+        (modbus.WRITE_SINGLE_COIL, bytes([5, 0, 1, 0xFF, 0]), None, True),
+    ],
+)
+def test_parse_pdu(function_code, pdu, count, result):
+    assert modbus.parse_pdu(function_code, pdu, count) == result
+
+
+@pytest.mark.parametrize(
+    "function_code, pdu, count, match",
+    [
+        (modbus.READ_INPUT_REGISTERS, bytes([0x84, 2]), 1, "exception code 2"),
+        (modbus.READ_INPUT_REGISTERS, bytes([3, 2, 0, 0]), 1, "Unexpected function"),
+        (modbus.READ_INPUT_REGISTERS, bytes([4, 2, 0, 0]), 2, "Expected 4 data bytes"),
+        (modbus.READ_INPUT_REGISTERS, bytes([4, 4, 0, 0]), None, "byte count"),
+        (modbus.READ_COILS, bytes([1]), 1, "no byte count"),
+    ],
+)
+def test_check_response(function_code, pdu, count, match):
+    with pytest.raises(modbus.ModbusError, match=match):
+        modbus.check_response(function_code, pdu, count)
+
+
+@pytest.mark.parametrize("protocol_id, length", [(1, 6), (0, 2), (0, 256)])
+def test_check_header(protocol_id, length):
+    with pytest.raises(modbus.ModbusError):
+        modbus.check_header(protocol_id, length)
@@ -0,0 +1,52 @@
+"""Tests of measurements of the simulated instrument in every AI range."""
+
+import pytest
+
+from xet7019z import xet7019z
+from xet7019z.xet7019z import _scale_table
+
+
+@pytest.fixture
+def daq(simulator):
+    daq = xet7019z()
+    yield daq
+    daq.disconnect()
+
+
+@pytest.mark.parametrize("data_format", ["hex", "eng"])
+@pytest.mark.parametrize("ai_range", sorted(xet7019z.ai_ranges))
+def test_measure_round_trip(simulator, daq, ai_range, data_format):
+    setting = xet7019z.ai_ranges[ai_range]
+    units_per_count, _, _ = _scale_table(data_format)
+
+    daq.connect(simulator.host, simulator.port, data_format=data_format)
+    daq.set_ai_range(0, ai_range)
+
+    midpoint = (setting["min"] + setting["max"]) / 2
+    for eng in [setting["min"], midpoint, setting["max"]]:
+        simulator.set_signal(0, lambda t: eng)
+
+        assert daq.measure(0) == pytest.approx(
+            eng, abs=float(units_per_count[ai_range])
+        )
+
+
+@pytest.mark.parametrize("ai_range", sorted(xet7019z.ai_ranges))
+def test_hex_registers(simulator, daq, ai_range):
+    setting = xet7019z.ai_ranges[ai_range]
+
+    daq.connect(simulator.host, simulator.port, data_format="hex")
+    daq.set_ai_range(0, ai_range)
+
+    # register values at the range limits are those of the published register
+    # table, and zero reads as zero counts in every range that includes it
+    expected = {setting["min"]: setting["hex_min"], setting["max"]: setting["hex_max"]}
+    if setting["min"] <= 0 <= setting["max"]:
+        expected[0] = 0x0000
+
+    for eng, value in expected.items():
+        simulator.set_signal(0, lambda t: eng)
+        register = daq.instr.read_input_registers(0, 1)[0]
+
+        # difference in counts, wrapped to 16 bits
+        assert abs((register - value + 0x8000) % 0x10000 - 0x8000) <= 1
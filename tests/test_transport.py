@@ -0,0 +1,78 @@
+"""Tests of pipelined requests of the Modbus TCP transport."""
+
+import socket
+
+import pytest
+
+from xet7019z.transport import PIPELINE_TIMEOUTS, ModbusTransport
+
+REQUESTS = [("read_input_registers", 0, 10), ("read_coils", 595, 10)]
+
+
+@pytest.fixture
+def transport(simulator):
+    transport = ModbusTransport(simulator.host, simulator.port, max_in_flight=4)
+    transport.open()
+    yield transport
+    transport.close()
+
+
+def fail_receive(transport, monkeypatch, error):
+    """Make the next response received by a transport fail with an error."""
+    receive = transport._receive
+
+    def _receive():
+        monkeypatch.setattr(transport, "_receive", receive)
+        raise error
+
+    monkeypatch.setattr(transport, "_receive", _receive)
+
+
+def test_pipeline(transport):
+    results = transport.pipeline(REQUESTS)
+
+    assert len(results[0]) == 10
+    assert results[1] == [True] * 10
+
+
+@pytest.mark.parametrize(
+    "error", [socket.timeout("timed out"), ConnectionResetError("reset")]
+)
+def test_connection_error_keeps_pipelining(transport, monkeypatch, error):
+    fail_receive(transport, monkeypatch, error)
+
+    with pytest.raises(OSError):
+        transport.pipeline(REQUESTS)
+    assert not transport.is_open
+    assert transport.max_in_flight == 4
+
+    transport.open()
+    assert len(transport.pipeline(REQUESTS)) == 2
+
+
+def test_repeated_timeouts_fall_back(transport, monkeypatch):
+    for _ in range(PIPELINE_TIMEOUTS - 1):
+        fail_receive(transport, monkeypatch, socket.timeout("timed out"))
+        with pytest.raises(socket.timeout):
+            transport.pipeline(REQUESTS)
+        transport.open()
+
+    fail_receive(transport, monkeypatch, socket.timeout("timed out"))
+    with pytest.warns(UserWarning, match="falling back"):
+        assert len(transport.pipeline(REQUESTS)) == 2
+    assert transport.max_in_flight == 1
+
+
+def test_unmatched_response_falls_back(transport, monkeypatch):
+    receive = transport._receive
+
+    def _receive():
+        monkeypatch.setattr(transport, "_receive", receive)
+        transaction_id, length = receive()
+        return transaction_id + 100, length
+
+    monkeypatch.setattr(transport, "_receive", _receive)
+
+    with pytest.warns(UserWarning, match="unexpected transaction id"):
+        assert len(transport.pipeline(REQUESTS)) == 2
+    assert transport.max_in_flight == 1